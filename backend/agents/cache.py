@@ -0,0 +1,101 @@
+import asyncio, hashlib, json, time
+from collections import OrderedDict
+
+_caches = {}
+
+
+def content_key(*parts) -> str:
+    """Stable hash of JSON-serializable parts, used as a cache key."""
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry TTL and single-flight loading.
+
+    Concurrent get_or_load calls for the same key share one in-flight loader.
+    A loader result of None is returned but not cached.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        _caches[name] = self
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key: str, loader):
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+
+        async def _load():
+            try:
+                loaded = await loader()
+                if loaded is not None:
+                    self.set(key, loaded)
+                return loaded
+            finally:
+                self._inflight.pop(key, None)
+
+        # Shielded so a cancelled caller doesn't abort the load for everyone waiting on it
+        future = asyncio.ensure_future(_load())
+        self._inflight[key] = future
+        return await asyncio.shield(future)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -1,5 +1,7 @@
-import os
+import asyncio, os
 from dotenv import load_dotenv
+from agents.executor import get_stage
+from agents.pool import AgentPool, bedrock_agent_factory
 
 load_dotenv()
 
@@ -20,27 +22,47 @@ FALLBACK_RESPONSES = {
     "IMMINENT": "I'm here with you. Your life has value and you matter. Please reach out to emergency services or a crisis line right now.",
 }
 
-_agent = None
+_pool = AgentPool("conversational", bedrock_agent_factory(SYSTEM_PROMPT))
 
 
-def _get_agent():
-    global _agent
-    if _agent is None:
-        try:
-            from strands import Agent
-            from aws_config import get_bedrock_model
-            _agent = Agent(model=get_bedrock_model(), system_prompt=SYSTEM_PROMPT, tools=[])
-        except Exception:
-            _agent = False
-    return _agent if _agent else None
+def _prompt(message: str, risk_level: str, resources: dict) -> str:
+    return f"User message: {message}\nRisk level: {risk_level}\nResources to surface: {resources}"
 
 
 async def get_conversational_response(message: str, risk_level: str, resources: dict) -> str:
-    agent = _get_agent()
-    if agent:
+    if await _pool.available():
         try:
-            raw = agent(f"User message: {message}\nRisk level: {risk_level}\nResources to surface: {resources}")
+            raw = await get_stage("conversational").run(_pool.invoke, _prompt(message, risk_level, resources))
             return raw.message["content"][0]["text"]
         except Exception:
             pass
     return FALLBACK_RESPONSES.get(risk_level, FALLBACK_RESPONSES["LOW"])
+
+
+async def stream_conversational_response(message: str, risk_level: str, resources: dict, timeout: float = None):
+    """Yield the reply as text chunks as the model produces them.
+
+    Falls back to the canned response if the model fails before its first chunk;
+    a failure mid-stream ends the reply where it stopped.
+    """
+    started = False
+    if await _pool.available():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or get_stage("conversational").timeout)
+        stream = _pool.stream(_prompt(message, risk_level, resources))
+        try:
+            while True:
+                # Bound each wait rather than wrapping the yields, so the deadline never fires in the consumer
+                try:
+                    chunk = await asyncio.wait_for(anext(stream), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                started = True
+                yield chunk
+        except Exception:
+            pass
+        finally:
+            await stream.aclose()
+        if started:
+            return
+    yield FALLBACK_RESPONSES.get(risk_level, FALLBACK_RESPONSES["LOW"])
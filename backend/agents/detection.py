@@ -1,5 +1,9 @@
-import json, re
+import asyncio, json, os, re
+import numpy as np
 from dotenv import load_dotenv
+from agents.executor import get_stage
+from agents.pool import AgentPool, bedrock_agent_factory
+from agents.cache import TTLCache, content_key
 
 load_dotenv()
 
@@ -31,55 +35,204 @@ CRISIS_KEYWORDS = {
     "withdrawal": ["alone", "isolated", "nobody cares", "disappear", "leave everyone"],
 }
 
-_agent = None
+# Weights for overall_risk_score, in the order the prompt formula sums them
+SIGNAL_WEIGHTS = {
+    "hopelessness": 0.25,
+    "suicidal_ideation": 0.30,
+    "self_harm": 0.20,
+    "urgency": 0.15,
+    "withdrawal": 0.10,
+}
 
+BATCH_LLM_CONCURRENCY = int(os.getenv("DETECTION_BATCH_CONCURRENCY", "8"))
 
-def _get_agent():
-    global _agent
-    if _agent is None:
-        try:
-            from strands import Agent
-            from aws_config import get_bedrock_model
-            _agent = Agent(model=get_bedrock_model(), system_prompt=SYSTEM_PROMPT, tools=[])
-        except Exception:
-            _agent = False
-    return _agent if _agent else None
+# Tiered policy: messages the heuristic scores at or below these limits skip the LLM
+TIERED_DETECTION = os.getenv("DETECTION_TIERED", "true").lower() in ("1", "true", "yes")
+SAFE_MAX_SCORE = float(os.getenv("DETECTION_SAFE_MAX_SCORE", "0"))
+SAFE_MAX_SIGNALS = int(os.getenv("DETECTION_SAFE_MAX_SIGNALS", "0"))
 
+_tier_counts = {"heuristic_safe": 0, "llm": 0, "heuristic_fallback": 0}
 
-def heuristic_detect(message: str) -> dict:
-    msg_lower = message.lower()
-    scores, triggered = {}, []
-    for signal, keywords in CRISIS_KEYWORDS.items():
-        score = min(10, sum(3 for kw in keywords if kw in msg_lower))
-        scores[signal] = score
-        if score > 0:
-            triggered.append(signal)
-
-    overall = min(100, round((
-        scores.get("hopelessness", 0) * 0.25 +
-        scores.get("suicidal_ideation", 0) * 0.30 +
-        scores.get("self_harm", 0) * 0.20 +
-        scores.get("urgency", 0) * 0.15 +
-        scores.get("withdrawal", 0) * 0.10
-    ) * 10))
-
-    level = "LOW" if overall < 30 else "MODERATE" if overall < 50 else "HIGH" if overall < 70 else "CRISIS" if overall < 90 else "IMMINENT"
+_pool = AgentPool("detection", bedrock_agent_factory(SYSTEM_PROMPT))
+_cache = TTLCache(
+    "detection",
+    max_size=int(os.getenv("DETECTION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("DETECTION_CACHE_TTL_SECONDS", "3600")),
+)
+
+
+def _build_trie(phrases) -> dict:
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return trie
+
+
+def _trie_regex(node: dict) -> str:
+    """Render a trie as a nested alternation so matching cost grows with phrase depth, not count."""
+    branches = [re.escape(ch) + _trie_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    return f"(?:{body})?" if "" in node else body
+
+
+def _contained_keywords(trie: dict, phrase: str) -> tuple:
+    found = set()
+    for start in range(len(phrase)):
+        node = trie
+        for end in range(start, len(phrase)):
+            node = node.get(phrase[end])
+            if node is None:
+                break
+            if "" in node:
+                found.add(phrase[start:end + 1])
+    return tuple(found)
+
+
+def compile_keyword_matcher(lexicon: dict):
+    """Compile a {signal: [keywords]} lexicon into a single overlapping-match regex.
+
+    Returns (pattern, credits) where credits maps every matchable phrase to the
+    keywords it implies (itself plus any shorter keyword contained in it), so a
+    longest match at a position still credits the shorter keywords inside it.
+    """
+    keywords = sorted({kw.lower() for kws in lexicon.values() for kw in kws})
+    trie = _build_trie(keywords)
+    pattern = re.compile(f"(?=({_trie_regex(trie)}))")
+    credits = {kw: _contained_keywords(trie, kw) for kw in keywords}
+    return pattern, credits
+
+
+_KEYWORD_SIGNALS = {}
+for _signal, _keywords in CRISIS_KEYWORDS.items():
+    for _kw in _keywords:
+        _KEYWORD_SIGNALS.setdefault(_kw.lower(), []).append(_signal)
+_KEYWORD_PATTERN, _KEYWORD_CREDITS = compile_keyword_matcher(CRISIS_KEYWORDS)
+
+
+def heuristic_signal_scores(message: str) -> dict:
+    """Per-signal keyword scores (3 per distinct keyword, capped at 10) from one scan of the message."""
+    found = set()
+    for m in _KEYWORD_PATTERN.finditer(message.lower()):
+        found.update(_KEYWORD_CREDITS[m.group(1)])
+    scores = dict.fromkeys(CRISIS_KEYWORDS, 0)
+    for kw in found:
+        for signal in _KEYWORD_SIGNALS[kw]:
+            scores[signal] += 3
+    return {k: min(10, v) for k, v in scores.items()}
+
+
+def risk_level_for(overall: float) -> str:
+    return "LOW" if overall < 30 else "MODERATE" if overall < 50 else "HIGH" if overall < 70 else "CRISIS" if overall < 90 else "IMMINENT"
+
+
+def _heuristic_result(scores: dict, overall: int) -> dict:
+    triggered = [signal for signal, score in scores.items() if score > 0]
     return {
-        "overall_risk_score": overall, "risk_level": level, "triggered_signals": triggered,
+        "overall_risk_score": overall, "risk_level": risk_level_for(overall), "triggered_signals": triggered,
         **{f"{k}_score": v for k, v in scores.items()},
         "reasoning": f"Heuristic detection. Triggered: {triggered}"
     }
 
 
+def heuristic_detect(message: str) -> dict:
+    scores = heuristic_signal_scores(message)
+    weighted = 0.0
+    for signal, weight in SIGNAL_WEIGHTS.items():
+        weighted += scores.get(signal, 0) * weight
+    return _heuristic_result(scores, min(100, round(weighted * 10)))
+
+
+def heuristic_detect_many(messages: list) -> list:
+    """Heuristic detection over a batch of messages, results in input order.
+
+    Builds the (messages x signals) score matrix and computes the weighted
+    overall score for the whole batch in one vectorized pass.
+    """
+    if not messages:
+        return []
+    signals = list(CRISIS_KEYWORDS)
+    rows = [heuristic_signal_scores(m) for m in messages]
+    matrix = np.array([[r[s] for s in signals] for r in rows], dtype=np.float64)
+
+    # Accumulate column by column in SIGNAL_WEIGHTS order so rounding matches heuristic_detect exactly
+    weighted = np.zeros(len(messages))
+    for signal, weight in SIGNAL_WEIGHTS.items():
+        weighted = weighted + matrix[:, signals.index(signal)] * weight
+    overall = np.minimum(100, np.round(weighted * 10)).astype(int).tolist()
+
+    return [_heuristic_result(r, o) for r, o in zip(rows, overall)]
+
+
+async def _llm_detect(message: str, audio_emotion: dict = None):
+    try:
+        raw = await get_stage("detection").run(_pool.invoke, f"User message: {message}\nVoice emotion data: {audio_emotion or {}}")
+        text = raw.message["content"][0]["text"]
+        match = re.search(r'\{.*\}', text, re.DOTALL)
+        if match:
+            return json.loads(match.group())
+    except Exception:
+        pass
+    return None
+
+
+def _normalize(message: str) -> str:
+    return " ".join(message.lower().split())
+
+
+def _clearly_safe(heuristic: dict, audio_emotion: dict = None) -> bool:
+    # Voice emotion is invisible to the keyword heuristic, so voice turns always escalate
+    return (TIERED_DETECTION and not audio_emotion
+            and len(heuristic["triggered_signals"]) <= SAFE_MAX_SIGNALS
+            and heuristic["overall_risk_score"] <= SAFE_MAX_SCORE)
+
+
 async def detect_risk(message: str, audio_emotion: dict = None) -> dict:
-    agent = _get_agent()
-    if agent:
-        try:
-            raw = agent(f"User message: {message}\nVoice emotion data: {audio_emotion or {}}")
-            text = raw.message["content"][0]["text"]
-            match = re.search(r'\{.*\}', text, re.DOTALL)
-            if match:
-                return json.loads(match.group())
-        except Exception:
-            pass
-    return heuristic_detect(message)
+    heuristic = heuristic_detect(message)
+    if _clearly_safe(heuristic, audio_emotion):
+        _tier_counts["heuristic_safe"] += 1
+        return heuristic
+
+    if await _pool.available():
+        # Only LLM results are cached; heuristic fallbacks are cheap and should not outlive a Bedrock outage
+        key = content_key(_normalize(message), audio_emotion or {})
+        result = await _cache.get_or_load(key, lambda: _llm_detect(message, audio_emotion))
+        if result is not None:
+            _tier_counts["llm"] += 1
+            return dict(result)
+    _tier_counts["heuristic_fallback"] += 1
+    return heuristic
+
+
+def tier_stats() -> dict:
+    total = sum(_tier_counts.values())
+    return {
+        **_tier_counts,
+        "llm_skip_rate": round(_tier_counts["heuristic_safe"] / total, 4) if total else 0.0,
+        "tiered": TIERED_DETECTION,
+        "safe_max_score": SAFE_MAX_SCORE,
+        "safe_max_signals": SAFE_MAX_SIGNALS,
+    }
+
+
+async def detect_risk_many(messages: list, use_llm: bool = True,
+                           concurrency: int = BATCH_LLM_CONCURRENCY) -> list:
+    """Score a batch of messages, results in input order.
+
+    Uses the vectorized heuristic when the LLM is disabled or unavailable;
+    otherwise fans out detect_risk calls with at most `concurrency` in flight.
+    """
+    if not use_llm or not await _pool.available():
+        return heuristic_detect_many(messages)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(message: str) -> dict:
+        async with semaphore:
+            return await detect_risk(message)
+
+    return await asyncio.gather(*(_one(m) for m in messages))
@@ -0,0 +1,100 @@
+import asyncio, os, threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StageExecutor:
+    """Runs blocking agent calls for one pipeline stage on its own bounded thread pool.
+
+    Keeps synchronous Strands/Bedrock calls off the event loop, caps how many run
+    at once and gives up waiting after `timeout` seconds (the worker thread still
+    finishes in the background; callers fall back as they would on any error).
+    """
+
+    def __init__(self, name: str, max_workers: int, timeout: float):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"agent-{name}")
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._running = 0
+        self._completed = 0
+        self._timeouts = 0
+
+    def _invoke(self, fn, args):
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _finished(self, _):
+        # Also fires for calls cancelled while still queued, which never reach _invoke
+        with self._lock:
+            self._completed += 1
+
+    async def run(self, fn, *args):
+        with self._lock:
+            self._submitted += 1
+        work = self._pool.submit(self._invoke, fn, args)
+        work.add_done_callback(self._finished)
+        future = asyncio.wrap_future(work)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = self._submitted - self._completed
+            return {
+                "max_workers": self.max_workers,
+                "timeout": self.timeout,
+                "running": self._running,
+                "queue_depth": in_flight - self._running,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "timeouts": self._timeouts,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Worker counts default to the agent pool size so every worker can hold an agent
+_STAGE_DEFAULTS = {
+    "detection": (4, 10.0),
+    "conversational": (4, 15.0),
+    "memory": (4, 10.0),
+}
+
+_stages = {}
+
+
+def get_stage(name: str) -> StageExecutor:
+    stage = _stages.get(name)
+    if stage is None:
+        workers, timeout = _STAGE_DEFAULTS.get(name, (4, 10.0))
+        prefix = name.upper()
+        workers = int(os.getenv(f"{prefix}_POOL_SIZE", str(workers)))
+        stage = StageExecutor(
+            name,
+            max_workers=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", str(workers))),
+            timeout=float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", str(timeout))),
+        )
+        _stages[name] = stage
+    return stage
+
+
+def stage_stats() -> dict:
+    return {name: get_stage(name).stats() for name in _STAGE_DEFAULTS}
+
+
+def shutdown_stages():
+    for stage in _stages.values():
+        stage.shutdown()
+    _stages.clear()
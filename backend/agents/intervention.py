@@ -77,22 +77,28 @@ def get_crisis_resources(risk_level: str) -> dict:
     return CRISIS_RESOURCES.get(risk_level, {})
 
 
+def intervention_resources(risk_level: str) -> dict:
+    """Resources run_intervention surfaces for a risk level, without any side effects."""
+    if risk_level == "LOW":
+        return {}
+    if risk_level == "MODERATE":
+        return {"tip": "Try deep breathing or grounding exercises"}
+    return get_crisis_resources(risk_level)
+
+
 async def run_intervention(user_id: str, patient_name: str, clinician_phone: str,
                            risk_level: str, risk_score: int, message: str,
                            emergency_contact: str = "", triggered_signals: list = None) -> dict:
     actions_taken = []
-    resources = {}
+    resources = intervention_resources(risk_level)
 
     if risk_level == "LOW":
-        return {"actions_taken": [], "resources": {}}
+        return {"actions_taken": [], "resources": resources}
 
     if risk_level == "MODERATE":
-        resources = {"tip": "Try deep breathing or grounding exercises"}
         actions_taken.append("coping_strategies_suggested")
         return {"actions_taken": actions_taken, "resources": resources}
 
-    resources = get_crisis_resources(risk_level)
-
     if risk_level in ["HIGH", "CRISIS", "IMMINENT"]:
         sms_result = await send_clinician_sms(clinician_phone, patient_name, risk_score, message)
         actions_taken.append(f"clinician_sms:{sms_result}")
@@ -1,6 +1,9 @@
-import json, re
+import json, os, re
+from collections import OrderedDict, deque
 import numpy as np
 from dotenv import load_dotenv
+from agents.executor import get_stage
+from agents.pool import AgentPool, bedrock_agent_factory
 
 load_dotenv()
 
@@ -11,38 +14,31 @@ Return ONLY a JSON object:
 {"crisis_probability": int, "timeWindow": "72hrs", "confidence": float, "driving_factors": [], "recommendation": "string"}
 """
 
-_agent = None
+_pool = AgentPool("memory", bedrock_agent_factory(SYSTEM_PROMPT))
 
+# Prior RiskHistory scores a prediction looks at, plus the current message's score
+TREND_WINDOW = 14
+TREND_CACHE_PATIENTS = int(os.getenv("TREND_CACHE_PATIENTS", "50000"))
 
-def _get_agent():
-    global _agent
-    if _agent is None:
-        try:
-            from strands import Agent
-            from aws_config import get_bedrock_model
-            _agent = Agent(model=get_bedrock_model(), system_prompt=SYSTEM_PROMPT, tools=[])
-        except Exception:
-            _agent = False
-    return _agent if _agent else None
 
-
-def compute_prediction(risk_scores: list) -> dict:
-    if len(risk_scores) < 2:
-        score = risk_scores[0] if risk_scores else 0
+def _prediction_from(n: int, slope: float, first: float, last: float, rising_streak: bool) -> dict:
+    if n < 2:
+        score = first if n else 0
         return {"crisis_probability": int(min(100, score)), "timeWindow": "72hrs",
                 "confidence": 0.5, "driving_factors": ["Insufficient history"], "recommendation": "Continue monitoring"}
 
-    x = np.arange(len(risk_scores))
-    slope = float(np.polyfit(x, risk_scores, 1)[0])
-    predicted = float(min(100, max(0, risk_scores[-1] + slope * 3)))
-    confidence = min(0.95, 0.5 + len(risk_scores) * 0.03)
+    # Closed-form and polyfit slopes differ in the last few bits; rounding first keeps
+    # int() and the thresholds below from flipping on that noise (e.g. 72.99999999 -> 72)
+    slope = round(slope, 9)
+    predicted = round(float(min(100, max(0, last + slope * 3))), 6)
+    confidence = min(0.95, 0.5 + n * 0.03)
 
     factors = []
     if slope > 5: factors.append("Rapid risk score escalation")
     elif slope > 2: factors.append("Gradual upward trend in risk")
     elif slope < -2: factors.append("Risk score improving")
-    if risk_scores[-1] > 70: factors.append("Current score in crisis range")
-    if len(risk_scores) >= 3 and all(risk_scores[-i] > risk_scores[-i - 1] for i in range(1, 3)):
+    if last > 70: factors.append("Current score in crisis range")
+    if rising_streak:
         factors.append("Consecutive session deterioration")
     if not factors: factors = ["Stable pattern observed"]
 
@@ -55,15 +51,139 @@ def compute_prediction(risk_scores: list) -> dict:
             "confidence": round(confidence, 2), "driving_factors": factors, "recommendation": rec}
 
 
-async def predict_crisis(user_id: str, risk_scores: list) -> dict:
-    agent = _get_agent()
-    if agent and len(risk_scores) >= 3:
+def compute_prediction(risk_scores: list) -> dict:
+    # Same closed-form least-squares slope as TrendStats and the batch job, so all three agree
+    return TrendStats(window=max(1, len(risk_scores)), scores=risk_scores).prediction()
+
+
+def compute_predictions_batch(scores: np.ndarray, lengths: np.ndarray) -> list:
+    """compute_prediction for many patients at once.
+
+    `scores` is a (patients x window) array with each patient's series
+    left-aligned (oldest first) and `lengths` the number of valid points per row;
+    padding values are ignored. The regression and streak flags are computed
+    across all rows in one vectorized pass; each row is then finished by
+    _prediction_from, like the scalar path.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    n = np.asarray(lengths, dtype=np.int64)
+    if scores.shape[0] == 0:
+        return []
+    x = np.arange(scores.shape[1], dtype=np.float64)
+    valid = x[None, :] < n[:, None]
+    y = np.where(valid, scores, 0.0)
+
+    nf = n.astype(np.float64)
+    sum_x = nf * (nf - 1) / 2
+    sum_xx = (nf - 1) * nf * (2 * nf - 1) / 6
+    sum_y = y.sum(axis=1)
+    sum_xy = (y * x[None, :]).sum(axis=1)
+    denom = nf * sum_xx - sum_x * sum_x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(n >= 2, (nf * sum_xy - sum_x * sum_y) / denom, 0.0)
+
+    rows = np.arange(len(n))
+    last = np.where(n >= 1, y[rows, np.maximum(n - 1, 0)], 0.0)
+    prev1 = y[rows, np.maximum(n - 2, 0)]
+    prev2 = y[rows, np.maximum(n - 3, 0)]
+    first = y[:, 0]
+    rising = (n >= 3) & (last > prev1) & (prev1 > prev2)
+
+    # Factors and recommendations come from the same code as the scalar path
+    return [
+        _prediction_from(int(n[i]), float(slope[i]), float(first[i]), float(last[i]), bool(rising[i]))
+        for i in range(len(n))
+    ]
+
+
+class TrendStats:
+    """Running least-squares sums over a patient's last `window` risk scores.
+
+    x is the position within the window (0 = oldest), so sliding the window
+    only needs O(1) updates to n, Σy, Σxy; Σx and Σx² are closed-form in n.
+    """
+
+    __slots__ = ("window", "scores", "sum_y", "sum_xy")
+
+    def __init__(self, window: int = TREND_WINDOW + 1, scores=()):
+        self.window = window
+        self.scores = deque(maxlen=window)
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        for score in scores:
+            self.push(score)
+
+    def push(self, score: float):
+        score = float(score)
+        if len(self.scores) == self.window:
+            self.sum_y -= self.scores.popleft()
+            # Every remaining point shifts one position left
+            self.sum_xy -= self.sum_y
+        self.sum_xy += len(self.scores) * score
+        self.scores.append(score)
+        self.sum_y += score
+
+    def pushed(self, score: float) -> "TrendStats":
+        """Copy with `score` appended, leaving this instance unchanged."""
+        clone = TrendStats.__new__(TrendStats)
+        clone.window = self.window
+        clone.scores = deque(self.scores, maxlen=self.window)
+        clone.sum_y = self.sum_y
+        clone.sum_xy = self.sum_xy
+        clone.push(score)
+        return clone
+
+    def slope(self) -> float:
+        n = len(self.scores)
+        if n < 2:
+            return 0.0
+        sum_x = n * (n - 1) / 2
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6
+        return (n * self.sum_xy - sum_x * self.sum_y) / (n * sum_xx - sum_x * sum_x)
+
+    def prediction(self) -> dict:
+        s = self.scores
+        n = len(s)
+        rising = n >= 3 and s[-1] > s[-2] > s[-3]
+        return _prediction_from(n, self.slope(), s[0] if n else 0, s[-1] if n else 0, rising)
+
+
+_trends = OrderedDict()
+
+
+def get_trend(user_id: str):
+    trend = _trends.get(user_id)
+    if trend is not None:
+        _trends.move_to_end(user_id)
+    return trend
+
+
+def seed_trend(user_id: str, risk_scores: list) -> TrendStats:
+    """Cache a patient's window built from their recent scores (oldest to newest)."""
+    trend = TrendStats(scores=risk_scores[-(TREND_WINDOW + 1):])
+    _trends[user_id] = trend
+    _trends.move_to_end(user_id)
+    while len(_trends) > TREND_CACHE_PATIENTS:
+        _trends.popitem(last=False)
+    return trend
+
+
+def record_risk_score(user_id: str, score: float):
+    """Fold a newly written RiskHistory score into the patient's cached window, if any."""
+    trend = _trends.get(user_id)
+    if trend is not None:
+        trend.push(score)
+
+
+async def predict_crisis(user_id: str, risk_scores: list, trend: TrendStats = None) -> dict:
+    """Predict from the LLM when available, else from `trend` (O(1)) or a polyfit over risk_scores."""
+    if await _pool.available() and len(risk_scores) >= 3:
         try:
-            raw = agent(f"User ID: {user_id}\nRisk score history (oldest to newest): {risk_scores}")
+            raw = await get_stage("memory").run(_pool.invoke, f"User ID: {user_id}\nRisk score history (oldest to newest): {risk_scores}")
             text = raw.message["content"][0]["text"]
             match = re.search(r'\{.*\}', text, re.DOTALL)
             if match:
                 return json.loads(match.group())
         except Exception:
             pass
-    return compute_prediction(risk_scores)
+    return trend.prediction() if trend is not None else compute_prediction(risk_scores)
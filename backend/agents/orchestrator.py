@@ -1,30 +1,68 @@
-from agents.detection import detect_risk
-from agents.conversational import get_conversational_response
-from agents.memory import predict_crisis
-from agents.intervention import run_intervention
+import asyncio, os
+from agents.detection import detect_risk, heuristic_detect
+from agents.conversational import get_conversational_response, stream_conversational_response, FALLBACK_RESPONSES
+from agents.memory import predict_crisis, compute_prediction, TrendStats
+from agents.intervention import run_intervention, intervention_resources
 
+# Per-stage latency budgets (seconds); a stage that misses its budget degrades to its fallback
+DETECTION_BUDGET = float(os.getenv("PIPELINE_DETECTION_BUDGET_SECONDS", "8"))
+PREDICTION_BUDGET = float(os.getenv("PIPELINE_PREDICTION_BUDGET_SECONDS", "6"))
+INTERVENTION_BUDGET = float(os.getenv("PIPELINE_INTERVENTION_BUDGET_SECONDS", "6"))
+REPLY_BUDGET = float(os.getenv("PIPELINE_REPLY_BUDGET_SECONDS", "10"))
 
-async def process_message(
-    user_id: str,
-    session_id: str,
-    message: str,
-    patient_name: str = "Patient",
-    clinician_phone: str = "",
-    emergency_contact: str = "",
-    risk_history: list = None,
-    audio_emotion: dict = None
-) -> dict:
+# Intervention side effects that outlive their budget keep running here
+_background_tasks = set()
+
+
+async def _within_budget(name: str, aw, budget: float, fallback, degraded: list):
+    try:
+        return await asyncio.wait_for(aw, budget)
+    except asyncio.TimeoutError:
+        degraded.append(name)
+        return fallback()
+
+
+async def _detect(message: str, audio_emotion: dict, degraded: list) -> dict:
+    return await _within_budget(
+        "detection", detect_risk(message, audio_emotion), DETECTION_BUDGET,
+        lambda: heuristic_detect(message), degraded
+    )
 
-    # Step 1: Detect risk
-    risk = await detect_risk(message, audio_emotion)
 
-    # Step 2: Memory prediction
+def _prediction_step(user_id: str, risk: dict, risk_history: list, trend: TrendStats, degraded: list):
+    if trend is not None:
+        window = trend.pushed(risk["overall_risk_score"])
+        return _within_budget(
+            "prediction", predict_crisis(user_id, list(window.scores), window), PREDICTION_BUDGET,
+            window.prediction, degraded
+        )
     scores = [r["score"] for r in (risk_history or [])]
     scores.append(risk["overall_risk_score"])
-    prediction = await predict_crisis(user_id, scores)
+    return _within_budget(
+        "prediction", predict_crisis(user_id, scores), PREDICTION_BUDGET,
+        lambda: compute_prediction(scores), degraded
+    )
+
+
+async def _record_late_intervention(user_id: str, session_id: str, patient_name: str, risk_level: str,
+                                    actions: list):
+    from datetime import datetime
+    from persistence import chat_writes, ChatWrite, intervention_rows
+    from websocket.events import sio
+    await chat_writes.submit(ChatWrite(session_id=session_id, messages=[],
+                                       interventions=intervention_rows(user_id, actions, datetime.utcnow())))
+    await sio.emit("intervention_fired", {
+        "user_id": user_id,
+        "patient_name": patient_name,
+        "actions": actions,
+        "risk_level": risk_level,
+    })
+
 
-    # Step 3: Intervention if needed
-    intervention_result = await run_intervention(
+def _intervention_step(user_id: str, session_id: str, patient_name: str, clinician_phone: str,
+                       emergency_contact: str, message: str, risk: dict, degraded: list):
+    # Shielded so alerts still go out after the budget expires
+    task = asyncio.create_task(run_intervention(
         user_id=user_id,
         patient_name=patient_name,
         clinician_phone=clinician_phone,
@@ -33,19 +71,137 @@ async def process_message(
         risk_score=int(risk["overall_risk_score"]),
         message=message,
         triggered_signals=risk.get("triggered_signals", [])
-    )
+    ))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    resources = intervention_resources(risk["risk_level"])
+    budget_expired = []
+
+    def fallback():
+        # The turn is saved without these actions; record them once they have actually gone out
+        budget_expired.append(True)
+        return {"actions_taken": [], "resources": resources}
+
+    def on_done(done: asyncio.Task):
+        if not budget_expired or done.cancelled() or done.exception() is not None:
+            return
+        actions = done.result().get("actions_taken", [])
+        if actions:
+            late = asyncio.create_task(_record_late_intervention(
+                user_id, session_id, patient_name, risk["risk_level"], actions))
+            _background_tasks.add(late)
+            late.add_done_callback(_background_tasks.discard)
+
+    task.add_done_callback(on_done)
+    return _within_budget("intervention_pending", asyncio.shield(task), INTERVENTION_BUDGET, fallback, degraded)
 
-    # Step 4: Empathetic response
-    agent_reply = await get_conversational_response(
-        message=message,
-        risk_level=risk["risk_level"],
-        resources=intervention_result.get("resources", {})
-    )
 
+def _result(agent_reply: str, risk: dict, prediction: dict, intervention_result: dict, degraded: list) -> dict:
     return {
         "agent_reply": agent_reply,
         "risk": risk,
         "prediction": prediction,
         "actions_taken": intervention_result.get("actions_taken", []),
-        "resources": intervention_result.get("resources", {})
+        "resources": intervention_result.get("resources", {}),
+        "degraded_stages": degraded,
     }
+
+
+async def process_message(
+    user_id: str,
+    session_id: str,
+    message: str,
+    patient_name: str = "Patient",
+    clinician_phone: str = "",
+    emergency_contact: str = "",
+    risk_history: list = None,
+    audio_emotion: dict = None,
+    trend: TrendStats = None
+) -> dict:
+    degraded = []
+
+    # Step 1: Detect risk
+    risk = await _detect(message, audio_emotion, degraded)
+    risk_level = risk["risk_level"]
+
+    # Steps 2-4 only depend on the risk result, so run them concurrently
+    prediction, intervention_result, agent_reply = await asyncio.gather(
+        # Step 2: Memory prediction
+        _prediction_step(user_id, risk, risk_history, trend, degraded),
+        # Step 3: Intervention if needed
+        _intervention_step(user_id, session_id, patient_name, clinician_phone, emergency_contact, message, risk,
+                           degraded),
+        # Step 4: Empathetic response
+        _within_budget(
+            "reply",
+            get_conversational_response(message=message, risk_level=risk_level,
+                                        resources=intervention_resources(risk_level)),
+            REPLY_BUDGET,
+            lambda: FALLBACK_RESPONSES.get(risk_level, FALLBACK_RESPONSES["LOW"]), degraded
+        ),
+    )
+
+    return _result(agent_reply, risk, prediction, intervention_result, degraded)
+
+
+async def process_message_stream(
+    user_id: str,
+    session_id: str,
+    message: str,
+    patient_name: str = "Patient",
+    clinician_phone: str = "",
+    emergency_contact: str = "",
+    risk_history: list = None,
+    audio_emotion: dict = None,
+    trend: TrendStats = None
+):
+    """Same pipeline as process_message, yielded as (event, data) pairs as results arrive.
+
+    Events: "risk" once detection finishes, "reply_chunk" per text delta,
+    "prediction" and "intervention" when those stages finish, and finally
+    "done" carrying the same dict process_message returns.
+    """
+    degraded = []
+    risk = await _detect(message, audio_emotion, degraded)
+    risk_level = risk["risk_level"]
+    yield "risk", risk
+
+    queue = asyncio.Queue()
+    finished = object()
+
+    async def _forward(name: str, step):
+        try:
+            result = await step
+            await queue.put((name, result))
+            return result
+        finally:
+            await queue.put((finished, None))
+
+    async def _reply():
+        chunks = []
+        async for chunk in stream_conversational_response(message, risk_level, intervention_resources(risk_level),
+                                                          timeout=REPLY_BUDGET):
+            chunks.append(chunk)
+            await queue.put(("reply_chunk", {"text": chunk}))
+        return "".join(chunks)
+
+    tasks = [
+        asyncio.create_task(_forward("prediction", _prediction_step(user_id, risk, risk_history, trend, degraded))),
+        asyncio.create_task(_forward("intervention", _intervention_step(
+            user_id, session_id, patient_name, clinician_phone, emergency_contact, message, risk, degraded))),
+        asyncio.create_task(_forward("reply", _reply())),
+    ]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            event, data = await queue.get()
+            if event is finished:
+                remaining -= 1
+            elif event != "reply":
+                yield event, data
+        prediction, intervention_result, agent_reply = [t.result() for t in tasks]
+    finally:
+        for t in tasks:
+            t.cancel()
+
+    yield "done", _result(agent_reply, risk, prediction, intervention_result, degraded)
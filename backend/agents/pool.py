@@ -0,0 +1,235 @@
+import asyncio, os, threading, time
+from contextlib import contextmanager
+
+_pools = {}
+_STREAM_END = object()
+
+
+def bedrock_agent_factory(system_prompt: str):
+    def factory():
+        from strands import Agent
+        from aws_config import get_bedrock_model
+        return Agent(model=get_bedrock_model(), system_prompt=system_prompt, tools=[])
+    return factory
+
+
+def _reset_conversation(agent):
+    # Strands agents append every exchange to agent.messages; checkouts must start clean
+    messages = getattr(agent, "messages", None)
+    if messages is not None:
+        messages.clear()
+
+
+class AgentPool:
+    """Thread-safe pool of Strands agents for one pipeline stage.
+
+    Agents are created lazily up to `max_size` and checked out exclusively for
+    one call. Before reuse an agent is health-checked: it is evicted after
+    `max_failures` consecutive failed calls or once it has sat idle longer than
+    `max_idle` seconds (its Bedrock connection has likely gone stale), and it is
+    retired after `max_uses` calls. If the first agent cannot be built
+    (no strands/Bedrock config) the pool is marked unavailable and callers use
+    their heuristic fallback.
+    """
+
+    def __init__(self, name: str, factory, max_size: int = None, max_uses: int = None,
+                 checkout_timeout: float = None, max_failures: int = None, max_idle: float = None,
+                 health_check=None):
+        prefix = name.upper()
+        self.name = name
+        self.factory = factory
+        self.max_size = max(1, max_size or int(os.getenv(f"{prefix}_POOL_SIZE", "4")))
+        self.max_uses = max_uses or int(os.getenv(f"{prefix}_POOL_MAX_USES", "500"))
+        self.checkout_timeout = checkout_timeout or float(os.getenv(f"{prefix}_POOL_CHECKOUT_TIMEOUT", "30"))
+        self.max_failures = max(1, max_failures or int(os.getenv(f"{prefix}_POOL_MAX_FAILURES", "3")))
+        self.max_idle = max_idle or float(os.getenv(f"{prefix}_POOL_MAX_IDLE_SECONDS", "300"))
+        # Optional extra per-stage check, applied on top of the failure and idle checks
+        self.health_check = health_check
+        self._cond = threading.Condition()
+        self._idle = []
+        self._uses = {}
+        self._failures = {}
+        self._last_used = {}
+        self._size = 0
+        self._available = None
+        self._probe_lock = None
+        self._created = 0
+        self._discarded = 0
+        self._evicted = 0
+        self._waits = 0
+        _pools[name] = self
+
+    def _probe(self):
+        try:
+            agent = self.factory()
+        except Exception:
+            self._available = False
+            return
+        with self._cond:
+            self._track(agent)
+            self._idle.append(agent)
+            self._size += 1
+        self._available = True
+
+    async def available(self) -> bool:
+        """Whether this stage can use agents; the first call builds one agent off the event loop."""
+        if self._available is None:
+            if self._probe_lock is None:
+                self._probe_lock = asyncio.Lock()
+            async with self._probe_lock:
+                if self._available is None:
+                    await asyncio.to_thread(self._probe)
+        return self._available
+
+    def _track(self, agent):
+        self._uses[id(agent)] = 0
+        self._failures[id(agent)] = 0
+        self._last_used[id(agent)] = time.monotonic()
+        self._created += 1
+
+    def _healthy(self, agent) -> bool:
+        if self._failures.get(id(agent), 0) >= self.max_failures:
+            return False
+        if time.monotonic() - self._last_used.get(id(agent), 0) > self.max_idle:
+            return False
+        return self.health_check is None or self.health_check(agent)
+
+    def _discard(self, agent):
+        self._uses.pop(id(agent), None)
+        self._failures.pop(id(agent), None)
+        self._last_used.pop(id(agent), None)
+        self._size -= 1
+        self._discarded += 1
+        self._cond.notify()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            while True:
+                while self._idle:
+                    agent = self._idle.pop()
+                    if self._healthy(agent):
+                        return agent
+                    self._evicted += 1
+                    self._discard(agent)
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No {self.name} agent available within {self.checkout_timeout}s")
+                self._waits += 1
+                self._cond.wait(remaining)
+        # Grow outside the lock; building an agent can be slow
+        try:
+            agent = self.factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._track(agent)
+        return agent
+
+    def release(self, agent, healthy: bool = True):
+        """Return `agent` after a call; `healthy=False` records a failed call against it."""
+        with self._cond:
+            uses = self._uses.get(id(agent), 0) + 1
+            failures = 0 if healthy else self._failures.get(id(agent), 0) + 1
+            if uses >= self.max_uses or failures >= self.max_failures:
+                self._discard(agent)
+                return
+            self._uses[id(agent)] = uses
+            self._failures[id(agent)] = failures
+            self._last_used[id(agent)] = time.monotonic()
+            _reset_conversation(agent)
+            self._idle.append(agent)
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self):
+        agent = self.acquire()
+        healthy = False
+        try:
+            yield agent
+            healthy = True
+        finally:
+            self.release(agent, healthy)
+
+    def invoke(self, prompt: str):
+        """Run one blocking agent call on a checked-out agent. Call from a worker thread."""
+        with self.checkout() as agent:
+            return agent(prompt)
+
+    def _stream_into(self, prompt: str, loop, queue, stop: threading.Event):
+        """Run Agent.stream_async to completion on this worker thread, handing deltas to `queue` on `loop`."""
+        async def consume():
+            with self.checkout() as agent:
+                async for event in agent.stream_async(prompt):
+                    if stop.is_set():
+                        # The consumer went away; the agent itself is fine
+                        return
+                    if "data" in event:
+                        loop.call_soon_threadsafe(queue.put_nowait, event["data"])
+
+        try:
+            asyncio.run(consume())
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+
+    async def stream(self, prompt: str):
+        """Yield text deltas from Agent.stream_async on a checked-out agent.
+
+        The stream occupies a worker of this pool's stage executor for its whole
+        length, so it counts against the same concurrency limit, timeout and
+        metrics as `invoke`.
+        """
+        from agents.executor import get_stage
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        run = asyncio.ensure_future(get_stage(self.name).run(
+            self._stream_into, prompt, asyncio.get_running_loop(), queue, stop))
+        getter = None
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, run}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done() and run.exception() is not None:
+                    # Stage timeout, or the call failed before handing over its end marker
+                    raise run.exception()
+                # The worker queues the end marker before its call completes
+                item = await getter
+                if item is _STREAM_END:
+                    await run
+                    return
+                yield item
+        finally:
+            stop.set()
+            if getter is not None:
+                getter.cancel()
+            run.cancel()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "available": self._available,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "created": self._created,
+                "discarded": self._discarded,
+                "evicted_unhealthy": self._evicted,
+                "checkout_waits": self._waits,
+            }
+
+
+def pool_stats() -> dict:
+    return {name: pool.stats() for name, pool in _pools.items()}
+
+
+async def warm_pools():
+    """Build each pool's first agent at startup so no request pays for it."""
+    for pool in list(_pools.values()):
+        await pool.available()
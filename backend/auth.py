@@ -1,10 +1,15 @@
+import os
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select, true
+from sqlalchemy.ext.asyncio import AsyncSession
 from config_secrets import get_secret
+from database import get_db
+from agents.cache import TTLCache
 
 SECRET_KEY = get_secret("JWT_SECRET_KEY", "changeme")
 ALGORITHM = get_secret("JWT_ALGORITHM", "HS256")
@@ -13,6 +18,14 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(get_secret("JWT_EXPIRY_MINUTES", "1440"))
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Patient-id sets per clinician. Each worker process holds its own copy, so
+# invalidation is local and the TTL bounds staleness across workers.
+_scope_cache = TTLCache(
+    "auth_scope",
+    max_size=int(os.getenv("AUTH_SCOPE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_SCOPE_CACHE_TTL_SECONDS", "300")),
+)
+
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -29,16 +42,74 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_clinician(token: str = Depends(oauth2_scheme)) -> str:
+def _decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        clinician_id: str = payload.get("sub")
-        if not clinician_id:
+        if not payload.get("sub"):
             raise ValueError
-        return clinician_id
+        return payload
     except (JWTError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+async def get_current_clinician(token: str = Depends(oauth2_scheme)) -> str:
+    return _decode_token(token)["sub"]
+
+
+class AuthContext:
+    """Who is calling and which patients they may see. patient_ids is None for admins (all patients)."""
+    __slots__ = ("clinician_id", "role", "patient_ids")
+
+    def __init__(self, clinician_id: str, role: Optional[str], patient_ids: Optional[frozenset]):
+        self.clinician_id = clinician_id
+        self.role = role
+        self.patient_ids = patient_ids
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+    def patient_filter(self, column):
+        """WHERE clause restricting a patient-id column to this caller's scope."""
+        return true() if self.patient_ids is None else column.in_(self.patient_ids)
+
+
+async def _load_patient_scope(db: AsyncSession, clinician_id: str) -> frozenset:
+    from models import User
+    result = await db.execute(select(User.id).where(User.clinician_id == clinician_id))
+    return frozenset(result.scalars().all())
+
+
+def invalidate_patient_scope(*clinician_ids: Optional[str]):
+    """Drop cached patient sets after a patient is assigned to (or moved off) a clinician."""
+    for clinician_id in clinician_ids:
+        if clinician_id:
+            _scope_cache.invalidate(clinician_id)
+
+
+async def get_auth_context(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> AuthContext:
+    payload = _decode_token(token)
+    clinician_id = payload["sub"]
+    role = payload.get("role")
+    if role is None:
+        # Tokens issued before the role claim existed
+        from models import Clinician
+        clinician = await db.get(Clinician, clinician_id)
+        role = clinician.role if clinician else None
+    if role == "admin":
+        return AuthContext(clinician_id, role, None)
+    patient_ids = await _scope_cache.get_or_load(clinician_id, lambda: _load_patient_scope(db, clinician_id))
+    return AuthContext(clinician_id, role, patient_ids)
+
+
+async def require_admin(auth: AuthContext = Depends(get_auth_context)) -> AuthContext:
+    if not auth.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return auth
@@ -33,11 +33,7 @@ def get_bedrock_model():
 
 
 async def upload_to_s3(file_bytes: bytes, key: str, content_type: str = "audio/webm") -> str:
-    """Upload bytes to S3 and return the object URL."""
-    s3_client.put_object(
-        Bucket=S3_BUCKET,
-        Key=key,
-        Body=file_bytes,
-        ContentType=content_type,
-    )
-    return f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{key}"
+    """Upload bytes to S3 (off the event loop) and return the object URL."""
+    from storage import s3_storage
+    stored = await s3_storage().upload_bytes(file_bytes, key, content_type)
+    return stored.url
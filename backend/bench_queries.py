@@ -0,0 +1,187 @@
+"""
+bench_queries.py — Seeds a large synthetic dataset and records EXPLAIN ANALYZE plans
+and timings for the queries behind each router endpoint.
+
+Run:  python bench_queries.py --seed --patients 5000 --out plans_before.json
+      python create_tables.py            # apply migrations / indexes
+      python bench_queries.py --out plans_after.json
+
+Synthetic rows use the "bench-" id prefix; --drop removes them.
+"""
+import argparse, json, statistics
+from create_tables import connect
+
+CLINICIAN = "bench-clinician"
+PATIENT = "bench-user-1"
+SESSION = "bench-session-1-1"
+
+SEED = """
+INSERT INTO clinicians (id, name, email, hashed_password, phone, role, created_at)
+VALUES (%(clinician)s, 'Bench Clinician', 'bench@mindguard.local', '', '', 'user', now())
+ON CONFLICT (id) DO NOTHING;
+
+INSERT INTO users (id, name, age, clinician_id, emergency_contact, created_at)
+SELECT 'bench-user-' || p, 'Bench Patient ' || p, 20 + p %% 50,
+       CASE WHEN p %% 10 = 0 THEN %(clinician)s ELSE NULL END, '', now()
+FROM generate_series(1, %(patients)s) p
+ON CONFLICT (id) DO NOTHING;
+
+INSERT INTO risk_history (id, user_id, score, risk_level, factors, predicted_score, date)
+SELECT 'bench-rh-' || p || '-' || d, 'bench-user-' || p, s,
+       CASE WHEN s < 30 THEN 'LOW' WHEN s < 50 THEN 'MODERATE' WHEN s < 70 THEN 'HIGH' ELSE 'CRISIS' END,
+       '{"signals": []}', s, now() - make_interval(hours => d)
+FROM generate_series(1, %(patients)s) p, generate_series(1, %(points)s) d,
+     LATERAL (SELECT (random() * 100)::int AS s) r
+ON CONFLICT DO NOTHING;
+
+INSERT INTO risk_daily_rollup (user_id, day, count, score_sum, max_score, crisis_count)
+SELECT user_id, date::date, count(*), sum(score), max(score),
+       count(*) FILTER (WHERE risk_level IN ('CRISIS', 'IMMINENT'))
+FROM risk_history WHERE id LIKE 'bench-%%'
+GROUP BY user_id, date::date
+ON CONFLICT (user_id, day) DO NOTHING;
+
+INSERT INTO sessions (id, user_id, start_time, overall_risk_score, status)
+SELECT 'bench-session-' || p || '-' || k, 'bench-user-' || p, now() - make_interval(days => k), 0, 'closed'
+FROM generate_series(1, %(patients)s) p, generate_series(1, %(sessions)s) k
+ON CONFLICT (id) DO NOTHING;
+
+INSERT INTO messages (id, session_id, sender, text, timestamp)
+SELECT 'bench-msg-' || p || '-' || k || '-' || m, 'bench-session-' || p || '-' || k,
+       CASE WHEN m %% 2 = 0 THEN 'user' ELSE 'agent' END, 'synthetic message',
+       now() - make_interval(days => k, mins => m)
+FROM generate_series(1, %(patients)s) p, generate_series(1, %(sessions)s) k, generate_series(1, %(messages)s) m
+ON CONFLICT DO NOTHING;
+
+INSERT INTO interventions (id, user_id, type, triggered_by, outcome, timestamp)
+SELECT 'bench-int-' || p || '-' || i, 'bench-user-' || p,
+       (ARRAY['sms', 'resources', 'booking', 'escalation'])[1 + i %% 4], 'agent', 'fired',
+       now() - make_interval(hours => i)
+FROM generate_series(1, %(patients)s) p, generate_series(1, %(interventions)s) i
+ON CONFLICT (id) DO NOTHING;
+"""
+
+DROP = """
+DELETE FROM messages WHERE id LIKE 'bench-%';
+DELETE FROM sessions WHERE id LIKE 'bench-%';
+DELETE FROM interventions WHERE id LIKE 'bench-%';
+DELETE FROM risk_history WHERE id LIKE 'bench-%';
+DELETE FROM risk_daily_rollup WHERE user_id LIKE 'bench-%';
+DELETE FROM risk_predictions WHERE user_id LIKE 'bench-%';
+DELETE FROM users WHERE id LIKE 'bench-%';
+DELETE FROM clinicians WHERE id LIKE 'bench-%';
+"""
+
+# (endpoint, SQL) — the statements each router issues, with bench ids bound
+QUERIES = [
+    ("dashboard.get_overview", """
+        WITH ranked AS (
+            SELECT user_id, score, risk_level, date,
+                   row_number() OVER (PARTITION BY user_id ORDER BY date DESC) AS rn
+            FROM risk_history
+            WHERE user_id IN (SELECT id FROM users WHERE clinician_id = %(clinician)s)
+        )
+        SELECT u.id, u.name, u.age, r.score, r.risk_level, r.date
+        FROM users u LEFT JOIN ranked r ON r.user_id = u.id AND r.rn <= 7
+        WHERE u.clinician_id = %(clinician)s
+        ORDER BY u.id, r.rn
+    """),
+    ("dashboard.get_analytics:totals", """
+        SELECT sum(crisis_count), sum(score_sum), sum(count) FROM risk_daily_rollup
+        WHERE user_id IN (SELECT id FROM users WHERE clinician_id = %(clinician)s)
+    """),
+    ("dashboard.get_analytics:interventions", """
+        SELECT type, count(id) FROM interventions
+        WHERE user_id IN (SELECT id FROM users WHERE clinician_id = %(clinician)s)
+        GROUP BY type
+    """),
+    ("dashboard.get_analytics:timeline", """
+        SELECT day, sum(score_sum) / sum(count), max(max_score), sum(crisis_count) FROM risk_daily_rollup
+        WHERE user_id IN (SELECT id FROM users WHERE clinician_id = %(clinician)s)
+        GROUP BY day ORDER BY day DESC LIMIT 30
+    """),
+    ("patients.get_all_patients", "SELECT * FROM users WHERE clinician_id = %(clinician)s"),
+    ("patients.get_patient_sessions", """
+        SELECT * FROM sessions WHERE user_id = %(patient)s ORDER BY start_time DESC, id DESC LIMIT 101
+    """),
+    ("patients.get_risk_history", """
+        SELECT * FROM risk_history WHERE user_id = %(patient)s AND date >= now() - interval '14 days'
+        ORDER BY date DESC, id DESC LIMIT 101
+    """),
+    ("risk.get_current_risk", "SELECT * FROM risk_history WHERE user_id = %(patient)s ORDER BY date DESC LIMIT 1"),
+    ("risk.get_risk_trend", """
+        SELECT * FROM risk_history WHERE user_id = %(patient)s AND date >= now() - interval '14 days'
+        ORDER BY date DESC, id DESC LIMIT 101
+    """),
+    ("chat.send_message:trend_seed", "SELECT score FROM risk_history WHERE user_id = %(patient)s ORDER BY date DESC LIMIT 15"),
+    ("chat.get_session_transcript", """
+        SELECT * FROM messages WHERE session_id = %(session)s ORDER BY timestamp, id LIMIT 101
+    """),
+    ("interventions.get_intervention_history", """
+        SELECT * FROM interventions WHERE user_id = %(patient)s ORDER BY timestamp DESC, id DESC LIMIT 101
+    """),
+]
+
+
+def _scan_nodes(plan: dict) -> list:
+    nodes = [f"{plan['Node Type']}" + (f" on {plan['Relation Name']}" if "Relation Name" in plan else "")
+             + (f" using {plan['Index Name']}" if "Index Name" in plan else "")]
+    for child in plan.get("Plans", []):
+        nodes.extend(_scan_nodes(child))
+    return nodes
+
+
+def run_benchmarks(cur, params: dict, runs: int) -> list:
+    results = []
+    for endpoint, sql in QUERIES:
+        timings, plan = [], None
+        for _ in range(runs):
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0][0]
+            timings.append(plan["Execution Time"])
+        results.append({
+            "endpoint": endpoint,
+            "median_ms": round(statistics.median(timings), 3),
+            "min_ms": round(min(timings), 3),
+            "nodes": _scan_nodes(plan["Plan"]),
+            "plan": plan,
+        })
+        scans = ", ".join(n for n in results[-1]["nodes"] if "Scan" in n)
+        print(f"{endpoint:45s} {results[-1]['median_ms']:10.3f} ms   {scans}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="insert the synthetic dataset first")
+    parser.add_argument("--drop", action="store_true", help="delete the synthetic dataset and exit")
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--points", type=int, default=60, help="risk_history rows per patient")
+    parser.add_argument("--sessions", type=int, default=5, help="sessions per patient")
+    parser.add_argument("--messages", type=int, default=20, help="messages per session")
+    parser.add_argument("--interventions", type=int, default=10, help="interventions per patient")
+    parser.add_argument("--runs", type=int, default=5, help="EXPLAIN ANALYZE runs per query")
+    parser.add_argument("--out", default="query_plans.json")
+    args = parser.parse_args()
+
+    conn = connect()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        if args.drop:
+            cur.execute(DROP)
+            print("Synthetic dataset removed.")
+        else:
+            if args.seed:
+                cur.execute(SEED, {"clinician": CLINICIAN, "patients": args.patients, "points": args.points,
+                                   "sessions": args.sessions, "messages": args.messages,
+                                   "interventions": args.interventions})
+                cur.execute("ANALYZE")
+                print(f"Seeded {args.patients} synthetic patients.")
+            results = run_benchmarks(cur, {"clinician": CLINICIAN, "patient": PATIENT, "session": SESSION}, args.runs)
+            with open(args.out, "w") as f:
+                json.dump(results, f, indent=2, default=str)
+            print(f"Wrote {len(results)} plans to {args.out}")
+    finally:
+        cur.close()
+        conn.close()
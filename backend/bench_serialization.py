@@ -0,0 +1,118 @@
+"""
+bench_serialization.py — Compares the old and new read-endpoint paths on a large response:
+ORM entities + hand-built dicts + jsonable_encoder/JSONResponse versus a
+column-projected Core select + orjson.
+
+Run:  python bench_serialization.py --seed --rows 10000
+      python bench_serialization.py --drop
+
+Synthetic rows use the "bench-" id prefix, like bench_queries.py.
+"""
+import argparse, asyncio, statistics, time, uuid
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, delete, insert
+from database import AsyncSessionLocal, engine
+from models import User, Session as DBSession, Message
+from serialization import json_response, rows_as_dicts
+
+PATIENT = "bench-serialization-user"
+SESSION = "bench-serialization-session"
+
+
+async def seed(rows: int):
+    start = datetime.utcnow() - timedelta(minutes=rows)
+    async with AsyncSessionLocal() as db:
+        if not await db.get(User, PATIENT):
+            db.add(User(id=PATIENT, name="Bench Patient", age=30, emergency_contact="", created_at=start))
+            db.add(DBSession(id=SESSION, user_id=PATIENT, start_time=start, overall_risk_score=0.0, status="closed"))
+            await db.flush()
+        await db.execute(insert(Message), [
+            {"id": f"bench-msg-{uuid.uuid4()}", "session_id": SESSION, "sender": "user" if i % 2 else "agent",
+             "text": f"synthetic message {i} " * 4, "risk_score": float(i % 100),
+             "triggered_signals": ["hopelessness"] if i % 7 == 0 else [],
+             "timestamp": start + timedelta(minutes=i)}
+            for i in range(rows)
+        ])
+        await db.commit()
+
+
+async def drop():
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Message).where(Message.session_id == SESSION))
+        await db.execute(delete(DBSession).where(DBSession.id == SESSION))
+        await db.execute(delete(User).where(User.id == PATIENT))
+        await db.commit()
+
+
+async def orm_default(limit: int):
+    """Previous path: hydrate Message entities, build dicts, default FastAPI encoding."""
+    t0 = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Message).where(Message.session_id == SESSION).order_by(Message.timestamp, Message.id).limit(limit)
+        )
+        messages = result.scalars().all()
+    t1 = time.perf_counter()
+    content = [
+        {"id": m.id, "sender": m.sender, "text": m.text,
+         "risk_score": m.risk_score, "triggered_signals": m.triggered_signals,
+         "timestamp": m.timestamp.isoformat() if m.timestamp else None}
+        for m in messages
+    ]
+    body = JSONResponse(jsonable_encoder(content)).body
+    t2 = time.perf_counter()
+    return t1 - t0, t2 - t1, len(body), len(messages)
+
+
+async def core_orjson(limit: int):
+    """Current path: column-projected Core select, row dicts, orjson rendering."""
+    t0 = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Message.id, Message.sender, Message.text, Message.risk_score,
+                   Message.triggered_signals, Message.timestamp)
+            .where(Message.session_id == SESSION).order_by(Message.timestamp, Message.id).limit(limit)
+        )
+        rows = result.all()
+    t1 = time.perf_counter()
+    body = json_response(rows_as_dicts(rows)).body
+    t2 = time.perf_counter()
+    return t1 - t0, t2 - t1, len(body), len(rows)
+
+
+async def run(limit: int, runs: int):
+    for name, fn in (("orm + jsonable_encoder", orm_default), ("core + orjson", core_orjson)):
+        await fn(limit)  # warm up connections and statement caches
+        fetch, encode, size, count = [], [], 0, 0
+        for _ in range(runs):
+            f, e, size, count = await fn(limit)
+            fetch.append(f * 1000)
+            encode.append(e * 1000)
+        total = [f + e for f, e in zip(fetch, encode)]
+        print(f"{name:24s} rows={count:6d} bytes={size:9d}  fetch {statistics.median(fetch):8.2f} ms  "
+              f"encode {statistics.median(encode):8.2f} ms  total {statistics.median(total):8.2f} ms")
+
+
+async def main(args):
+    try:
+        if args.drop:
+            await drop()
+            print("Synthetic dataset removed.")
+            return
+        if args.seed:
+            await seed(args.rows)
+            print(f"Seeded {args.rows} messages.")
+        await run(args.rows, args.runs)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="insert the synthetic messages first")
+    parser.add_argument("--drop", action="store_true", help="delete the synthetic messages and exit")
+    parser.add_argument("--rows", type=int, default=10000, help="rows per response")
+    parser.add_argument("--runs", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -3,8 +3,10 @@ create_tables.py — Creates all MindGuard Pro tables in PostgreSQL and seeds de
 Run: python create_tables.py
 """
 import psycopg2
+from psycopg2 import errors as pg_errors
 from datetime import datetime, timezone
 import os
+from partitions import partition_setup_statements, PARTITION_MONTHS_AHEAD
 
 def now(): return datetime.now(timezone.utc)
 
@@ -41,7 +43,10 @@ CREATE TABLE IF NOT EXISTS users (
     age               INTEGER,
     clinician_id      VARCHAR REFERENCES clinicians(id),
     emergency_contact VARCHAR,
-    created_at        TIMESTAMP
+    created_at        TIMESTAMP,
+    latest_risk_score FLOAT,
+    latest_risk_level VARCHAR,
+    last_active_at    TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS sessions (
@@ -53,25 +58,49 @@ CREATE TABLE IF NOT EXISTS sessions (
     status              VARCHAR DEFAULT 'active'
 );
 
+-- messages and risk_history are range-partitioned by month (see partitions.py)
 CREATE TABLE IF NOT EXISTS messages (
-    id                VARCHAR PRIMARY KEY,
+    id                VARCHAR,
     session_id        VARCHAR REFERENCES sessions(id),
     sender            VARCHAR,
     text              TEXT,
     audio_url         VARCHAR,
     risk_score        FLOAT,
     triggered_signals JSONB,
-    timestamp         TIMESTAMP
-);
+    timestamp         TIMESTAMP NOT NULL,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
 
 CREATE TABLE IF NOT EXISTS risk_history (
-    id              VARCHAR PRIMARY KEY,
+    id              VARCHAR,
     user_id         VARCHAR REFERENCES users(id),
     score           FLOAT,
     risk_level      VARCHAR,
     factors         JSONB,
     predicted_score FLOAT,
-    date            TIMESTAMP
+    date            TIMESTAMP NOT NULL,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+
+CREATE TABLE IF NOT EXISTS risk_predictions (
+    user_id            VARCHAR PRIMARY KEY REFERENCES users(id),
+    crisis_probability INTEGER,
+    confidence         FLOAT,
+    time_window        VARCHAR DEFAULT '72hrs',
+    driving_factors    JSONB,
+    recommendation     VARCHAR,
+    history_points     INTEGER,
+    computed_at        TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS risk_daily_rollup (
+    user_id      VARCHAR REFERENCES users(id),
+    day          DATE,
+    count        INTEGER DEFAULT 0,
+    score_sum    FLOAT DEFAULT 0.0,
+    max_score    FLOAT DEFAULT 0.0,
+    crisis_count INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, day)
 );
 
 CREATE TABLE IF NOT EXISTS interventions (
@@ -84,6 +113,176 @@ CREATE TABLE IF NOT EXISTS interventions (
 );
 """
 
+# ── Migrations ────────────────────────────────────────────────────────────────
+# Applied in version order and recorded in schema_migrations. Entries marked
+# concurrent run outside a transaction (required for CREATE INDEX CONCURRENTLY),
+# so indexes build without blocking writes on a live database.
+MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version    INTEGER PRIMARY KEY,
+    name       VARCHAR NOT NULL,
+    applied_at TIMESTAMP NOT NULL
+)
+"""
+
+# One-time backfill of the denormalized latest-risk columns on users
+BACKFILL_LATEST_RISK = """
+UPDATE users u
+SET latest_risk_score = latest.score,
+    latest_risk_level = latest.risk_level,
+    last_active_at    = latest.date
+FROM (
+    SELECT DISTINCT ON (user_id) user_id, score, risk_level, date
+    FROM risk_history
+    ORDER BY user_id, date DESC
+) latest
+WHERE u.id = latest.user_id AND u.last_active_at IS NULL
+"""
+
+# Rebuild risk_daily_rollup from raw history (run once when the table is introduced)
+BACKFILL_DAILY_ROLLUP = """
+INSERT INTO risk_daily_rollup (user_id, day, count, score_sum, max_score, crisis_count)
+SELECT user_id, date::date, count(*), sum(score), max(score),
+       count(*) FILTER (WHERE risk_level IN ('CRISIS', 'IMMINENT'))
+FROM risk_history
+WHERE user_id IS NOT NULL AND date IS NOT NULL
+GROUP BY user_id, date::date
+ON CONFLICT (user_id, day) DO UPDATE SET
+    count = EXCLUDED.count, score_sum = EXCLUDED.score_sum,
+    max_score = EXCLUDED.max_score, crisis_count = EXCLUDED.crisis_count
+"""
+
+# (index name, table, columns) for the hot filter/sort paths; mirrored in models.py
+HOT_PATH_INDEXES = [
+    ("ix_risk_history_user_date", "risk_history", "user_id, date"),
+    ("ix_messages_session_timestamp", "messages", "session_id, timestamp"),
+    ("ix_interventions_user_timestamp", "interventions", "user_id, timestamp"),
+    ("ix_sessions_user_start_time", "sessions", "user_id, start_time"),
+    ("ix_users_clinician_id", "users", "clinician_id"),
+]
+
+# Keyset pagination orders by (timestamp, id); these replace the matching hot-path indexes
+KEYSET_INDEXES = [
+    ("ix_risk_history_user_date_id", "risk_history", "user_id, date, id", "ix_risk_history_user_date"),
+    ("ix_messages_session_timestamp_id", "messages", "session_id, timestamp, id", "ix_messages_session_timestamp"),
+    ("ix_interventions_user_timestamp_id", "interventions", "user_id, timestamp, id", "ix_interventions_user_timestamp"),
+    ("ix_sessions_user_start_time_id", "sessions", "user_id, start_time, id", "ix_sessions_user_start_time"),
+]
+
+def partition_conversion(table: str, key: str, foreign_key: str, indexes: list) -> str:
+    """Rebuild an existing plain table as a monthly-partitioned one, copying its rows. No-op if already partitioned."""
+    index_names = ", ".join(name for name, _ in indexes)
+    create_indexes = "\n        ".join(f"CREATE INDEX {name} ON {table} ({cols});" for name, cols in indexes if cols)
+    return f"""
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('{table}') AND relkind = 'r') THEN
+        ALTER TABLE {table} RENAME TO {table}_legacy;
+        ALTER TABLE {table}_legacy RENAME CONSTRAINT {table}_pkey TO {table}_legacy_pkey;
+        DROP INDEX IF EXISTS {index_names};
+        CREATE TABLE {table} (LIKE {table}_legacy INCLUDING DEFAULTS) PARTITION BY RANGE ({key});
+        UPDATE {table}_legacy SET {key} = TIMESTAMP 'epoch' WHERE {key} IS NULL;
+        ALTER TABLE {table} ALTER COLUMN {key} SET NOT NULL,
+            ADD PRIMARY KEY (id, {key}),
+            ADD FOREIGN KEY {foreign_key};
+        {create_indexes}
+        CREATE TABLE {table}_default PARTITION OF {table} DEFAULT;
+        PERFORM ensure_monthly_partitions('{table}',
+            COALESCE((SELECT min({key}) FROM {table}_legacy WHERE {key} > TIMESTAMP 'epoch')::date, current_date),
+            (current_date + interval '{PARTITION_MONTHS_AHEAD} months')::date);
+        INSERT INTO {table} SELECT * FROM {table}_legacy;
+        DROP TABLE {table}_legacy;
+    END IF;
+END $$
+"""
+
+
+MIGRATIONS = [
+    (1, "clinician_role_and_user_link", False, [
+        "ALTER TABLE clinicians ADD COLUMN IF NOT EXISTS role VARCHAR DEFAULT 'user'",
+        "ALTER TABLE clinicians ADD COLUMN IF NOT EXISTS user_id VARCHAR",
+    ]),
+    (2, "users_latest_risk_columns", False, [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS latest_risk_score FLOAT",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS latest_risk_level VARCHAR",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS last_active_at TIMESTAMP",
+        BACKFILL_LATEST_RISK,
+    ]),
+    (3, "hot_path_indexes", True, [
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({cols})"
+        for name, table, cols in HOT_PATH_INDEXES
+    ]),
+    (4, "risk_daily_rollup_backfill", False, [
+        BACKFILL_DAILY_ROLLUP,
+    ]),
+    (5, "keyset_pagination_indexes", True, [
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({cols})"
+        for name, table, cols, _ in KEYSET_INDEXES
+    ] + [
+        f"DROP INDEX CONCURRENTLY IF EXISTS {replaced}"
+        for _, _, _, replaced in KEYSET_INDEXES
+    ]),
+    # Runs in one transaction; the parents are locked while rows are copied
+    (6, "monthly_partitions", False, partition_setup_statements()[:1] + [
+        partition_conversion("messages", "timestamp", "(session_id) REFERENCES sessions(id)", [
+            ("ix_messages_session_timestamp", None),
+            ("ix_messages_session_timestamp_id", "session_id, timestamp, id"),
+        ]),
+        partition_conversion("risk_history", "date", "(user_id) REFERENCES users(id)", [
+            ("ix_risk_history_user_date", None),
+            ("ix_risk_history_user_date_id", "user_id, date, id"),
+        ]),
+    ] + partition_setup_statements()[1:]),
+]
+
+
+def drop_invalid_indexes(cur):
+    """Drop indexes left INVALID by an interrupted CONCURRENTLY build so they get rebuilt."""
+    cur.execute("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid AND c.relname = ANY(%s)
+    """, ([name for name, _, _ in HOT_PATH_INDEXES] + [name for name, _, _, _ in KEYSET_INDEXES],))
+    for (name,) in cur.fetchall():
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def migrate(conn):
+    """Apply pending migrations; returns the versions applied."""
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(MIGRATIONS_TABLE)
+    cur.execute("SELECT version FROM schema_migrations")
+    applied = {v for (v,) in cur.fetchall()}
+    done = []
+    for version, name, concurrent, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        if concurrent:
+            drop_invalid_indexes(cur)
+            for sql in statements:
+                try:
+                    cur.execute(sql)
+                except pg_errors.FeatureNotSupported:
+                    # Partitioned parents don't support CONCURRENTLY; their indexes cascade to each partition
+                    cur.execute(sql.replace(" CONCURRENTLY", ""))
+            cur.execute("INSERT INTO schema_migrations VALUES (%s, %s, %s)", (version, name, now()))
+        else:
+            conn.autocommit = False
+            try:
+                for sql in statements:
+                    cur.execute(sql)
+                cur.execute("INSERT INTO schema_migrations VALUES (%s, %s, %s)", (version, name, now()))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+        print(f"Applied migration {version:03d} {name}.")
+        done.append(version)
+    cur.close()
+    return done
+
 
 # ── Main ──────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
@@ -92,13 +291,12 @@ if __name__ == "__main__":
     cur = conn.cursor()
     try:
         cur.execute(TABLES)
+        conn.commit()
         print("Tables created.")
-        for sql in [
-            "ALTER TABLE clinicians ADD COLUMN IF NOT EXISTS role VARCHAR DEFAULT 'user'",
-            "ALTER TABLE clinicians ADD COLUMN IF NOT EXISTS user_id VARCHAR",
-        ]:
+        migrate(conn)
+        # Top up future monthly partitions
+        for sql in partition_setup_statements():
             cur.execute(sql)
-        conn.commit()
         print("Done.")
     except Exception as e:
         conn.rollback()
@@ -1,7 +1,9 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import exc
 from datetime import datetime, timedelta, timezone
-import uuid, random
+import uuid, random, time
 from config_secrets import get_secret
 
 DB_HOST = get_secret("DB_HOST_NAME", "localhost")
@@ -10,12 +12,93 @@ DB_NAME = get_secret("DB_NAME", "caresync_ai")
 DB_USER = get_secret("DB_USER", "postgres")
 DB_PASSWORD = get_secret("DB_PASSWORD", "admin123")
 
-print(f"[DB CONFIG] Host: {DB_HOST}, Port: {DB_PORT}, DB: {DB_NAME}, User: {DB_USER}")
+# Optional streaming replica for read-only endpoints; without one, reads still get their own pool
+DB_READ_HOST = get_secret("DB_READ_HOST_NAME", "")
+DB_READ_PORT = get_secret("DB_READ_PORT", DB_PORT)
+
+DB_POOL_SIZE = int(get_secret("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(get_secret("DB_MAX_OVERFLOW", "20"))
+DB_READ_POOL_SIZE = int(get_secret("DB_READ_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_READ_MAX_OVERFLOW = int(get_secret("DB_READ_MAX_OVERFLOW", str(DB_MAX_OVERFLOW)))
+DB_POOL_RECYCLE = int(get_secret("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_TIMEOUT = float(get_secret("DB_POOL_TIMEOUT_SECONDS", "30"))
+# asyncpg prepared-statement cache; set to 0 behind PgBouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(get_secret("DB_STATEMENT_CACHE_SIZE", "100"))
+
+print(f"[DB CONFIG] Host: {DB_HOST}, Port: {DB_PORT}, DB: {DB_NAME}, User: {DB_USER}, "
+      f"Read host: {DB_READ_HOST or DB_HOST}")
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+READ_DATABASE_URL = (
+    f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_READ_HOST}:{DB_READ_PORT}/{DB_NAME}"
+    if DB_READ_HOST else DATABASE_URL
+)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait to check out a connection (including connect time)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            if wait > 0.001:
+                self.waited += 1
+
+    def recreate(self):
+        # Keep counters across pool recreation (e.g. after engine.dispose())
+        new = super().recreate()
+        new.checkouts, new.waited, new.wait_total = self.checkouts, self.waited, self.wait_total
+        new.wait_max, new.timeouts = self.wait_max, self.timeouts
+        return new
+
+    def stats(self) -> dict:
+        capacity = self.size() + self._max_overflow
+        checked_out = self.checkedout()
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": checked_out,
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "saturation": round(checked_out / capacity, 4) if capacity > 0 else 0.0,
+            "checkouts": self.checkouts,
+            "checkouts_waited": self.waited,
+            "checkout_timeouts": self.timeouts,
+            "checkout_wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "checkout_wait_max_ms": round(self.wait_max * 1000, 3),
+        }
+
 
-engine = create_async_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
+def _make_engine(url: str, pool_size: int, max_overflow: int):
+    return create_async_engine(
+        url, echo=False, pool_pre_ping=True, poolclass=InstrumentedPool,
+        pool_size=pool_size, max_overflow=max_overflow,
+        pool_recycle=DB_POOL_RECYCLE, pool_timeout=DB_POOL_TIMEOUT,
+        connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+    )
+
+
+engine = _make_engine(DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW)
+read_engine = _make_engine(READ_DATABASE_URL, DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False)
 
 
 def now():
@@ -31,11 +114,34 @@ async def get_db():
         yield session
 
 
+async def get_read_db():
+    """Session for read-only endpoints; served by the replica when DB_READ_HOST_NAME is set."""
+    async with ReadSessionLocal() as session:
+        yield session
+
+
+def pool_metrics() -> dict:
+    return {
+        "primary": engine.pool.stats(),
+        "read": read_engine.pool.stats(),
+        "read_replica": bool(DB_READ_HOST),
+    }
+
+
+async def dispose_engines():
+    await engine.dispose()
+    await read_engine.dispose()
+
+
 async def init_db():
     from models import Base, Clinician, User, Session as DBSession, Message, RiskHistory, Intervention
     from auth import get_password_hash
+    from rollups import record_daily_risk
+    from partitions import partition_setup_statements
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for sql in partition_setup_statements():
+            await conn.exec_driver_sql(sql)
 
     async with AsyncSessionLocal() as db:
         from sqlalchemy import select
@@ -72,12 +178,16 @@ async def init_db():
         for uid, scores in risk_profiles.items():
             for i, score in enumerate(scores):
                 level = next(v for (lo, hi), v in risk_levels.items() if lo <= score < hi)
+                date = now() - timedelta(days=6 - i)
                 db.add(RiskHistory(
                     id=str(uuid.uuid4()), user_id=uid, score=float(score), risk_level=level,
                     factors={"signals": ["hopelessness", "withdrawal"] if score > 60 else ["stress"]},
                     predicted_score=float(min(100, score + 5)),
-                    date=now() - timedelta(days=6 - i)
+                    date=date
                 ))
+                await record_daily_risk(db, uid, float(score), level, date)
+            patient = await db.get(User, uid)
+            patient.latest_risk_score, patient.latest_risk_level, patient.last_active_at = float(score), level, date
 
         session_id = "session-demo-1"
         db.add(DBSession(id=session_id, user_id="user-1",
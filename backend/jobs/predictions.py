@@ -0,0 +1,114 @@
+"""
+Population-wide crisis prediction job.
+
+Scores every patient's recent risk series in one vectorized pass and upserts
+the results into risk_predictions, which the predict and outreach endpoints read.
+The first run scores everyone; later runs rescore only patients with risk
+history recorded since the previous run, plus any patient not yet scored. Reads
+never go past the retention horizon, so old partitions are pruned from the scan.
+"""
+import asyncio, os
+import numpy as np
+from datetime import datetime, date
+from sqlalchemy import select, desc, func, exists, or_
+from sqlalchemy.dialects.postgresql import insert
+from database import AsyncSessionLocal
+from models import User, RiskHistory, RiskPrediction
+from agents.memory import compute_predictions_batch, TREND_WINDOW
+from jobs.retention import PARTITION_RETENTION_MONTHS, retention_cutoff
+
+PREDICTION_JOB_INTERVAL = float(os.getenv("PREDICTION_JOB_INTERVAL_SECONDS", "300"))
+UPSERT_CHUNK = 1000
+
+
+def _stale_patients(since: datetime):
+    """Patients with risk history recorded at or after `since`, or with no prediction yet."""
+    changed = select(RiskHistory.user_id).where(RiskHistory.date >= since)
+    unscored = ~exists().where(RiskPrediction.user_id == User.id)
+    return select(User.id).where(or_(User.id.in_(changed), unscored))
+
+
+async def load_risk_series(db, window: int = TREND_WINDOW + 1, since: datetime = None):
+    """Return (user_ids, scores, lengths): each patient's last `window` scores, oldest first, left-aligned.
+
+    With `since`, only patients from _stale_patients(since) are loaded.
+    """
+    patients = select(User.id) if since is None else _stale_patients(since)
+    history = select(
+        RiskHistory.user_id, RiskHistory.score,
+        func.row_number().over(partition_by=RiskHistory.user_id, order_by=desc(RiskHistory.date)).label("rn")
+    )
+    if PARTITION_RETENTION_MONTHS > 0:
+        horizon = retention_cutoff(date.today(), PARTITION_RETENTION_MONTHS)
+        history = history.where(RiskHistory.date >= datetime.combine(horizon, datetime.min.time()))
+    if since is not None:
+        history = history.where(RiskHistory.user_id.in_(patients))
+    ranked = history.subquery()
+    rows = (await db.execute(
+        select(ranked.c.user_id, ranked.c.score, ranked.c.rn).where(ranked.c.rn <= window)
+    )).all()
+    user_ids = (await db.execute(patients)).scalars().all()
+
+    index = {uid: i for i, uid in enumerate(user_ids)}
+    scores = np.zeros((len(user_ids), window))
+    lengths = np.zeros(len(user_ids), dtype=np.int64)
+    by_user = {}
+    for uid, score, rn in rows:
+        if uid in index:
+            by_user.setdefault(uid, []).append((rn, score))
+    for uid, points in by_user.items():
+        i = index[uid]
+        # rn 1 is newest; place oldest at column 0
+        n = len(points)
+        for rn, score in points:
+            scores[i, n - rn] = score or 0.0
+        lengths[i] = n
+    return user_ids, scores, lengths
+
+
+async def refresh_predictions(since: datetime = None) -> int:
+    """Upsert predictions for every patient, or only those stale since `since`; returns how many."""
+    async with AsyncSessionLocal() as db:
+        user_ids, scores, lengths = await load_risk_series(db, since=since)
+        predictions = compute_predictions_batch(scores, lengths)
+        computed_at = datetime.utcnow()
+        values = [
+            {"user_id": uid, "crisis_probability": p["crisis_probability"], "confidence": p["confidence"],
+             "time_window": p["timeWindow"], "driving_factors": p["driving_factors"],
+             "recommendation": p["recommendation"], "history_points": int(n), "computed_at": computed_at}
+            for uid, p, n in zip(user_ids, predictions, lengths)
+        ]
+        for start in range(0, len(values), UPSERT_CHUNK):
+            stmt = insert(RiskPrediction).values(values[start:start + UPSERT_CHUNK])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[RiskPrediction.user_id],
+                set_={c: stmt.excluded[c] for c in (
+                    "crisis_probability", "confidence", "time_window", "driving_factors",
+                    "recommendation", "history_points", "computed_at")},
+            )
+            await db.execute(stmt)
+        await db.commit()
+        return len(values)
+
+
+async def run_prediction_job(interval: float = PREDICTION_JOB_INTERVAL):
+    since = None
+    while True:
+        started = datetime.utcnow()
+        try:
+            count = await refresh_predictions(since)
+            # Rows written while this run was reading are picked up by the next one
+            since = started
+            print(f"[Predictions] refreshed {count} patients")
+        except Exception as e:
+            print(f"[Predictions] refresh failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def prediction_as_dict(row: RiskPrediction) -> dict:
+    return {
+        "crisis_probability": row.crisis_probability, "timeWindow": row.time_window,
+        "confidence": row.confidence, "driving_factors": row.driving_factors,
+        "recommendation": row.recommendation,
+        "computed_at": row.computed_at.isoformat() if row.computed_at else None,
+    }
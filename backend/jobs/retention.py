@@ -0,0 +1,106 @@
+"""
+Partition maintenance and archival for messages and risk_history.
+
+Each run creates upcoming monthly partitions, detaches partitions whose month
+is more than PARTITION_RETENTION_MONTHS old and exports every detached
+partition to gzip-compressed NDJSON under ARCHIVE_DIR before dropping it.
+A partition whose export fails stays detached and is retried on the next run.
+"""
+import asyncio, gzip, json, os, re
+from datetime import date
+from sqlalchemy import text
+from database import engine
+from partitions import PARTITIONED_TABLES, ensure_partitions
+
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "24"))
+RETENTION_JOB_INTERVAL = float(os.getenv("RETENTION_JOB_INTERVAL_SECONDS", "86400"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+EXPORT_CHUNK = 5000
+
+
+def _partition_month(parent: str, name: str):
+    match = re.fullmatch(rf"{parent}_p(\d{{4}})_(\d{{2}})", name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def retention_cutoff(today: date, months: int) -> date:
+    """First day of the oldest month to keep; partitions for earlier months are archived."""
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def _monthly_tables(parent: str) -> list:
+    """(name, month, attached) for every <parent>_pYYYY_MM table, attached or detached."""
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text("""
+            SELECT c.relname, i.inhparent IS NOT NULL
+            FROM pg_class c LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+            WHERE c.relkind = 'r' AND c.relnamespace = 'public'::regnamespace
+              AND c.relname LIKE :prefix
+        """), {"prefix": f"{parent}\\_p%"})).all()
+    out = []
+    for name, attached in rows:
+        month = _partition_month(parent, name)
+        if month is not None:
+            out.append((name, month, attached))
+    return sorted(out, key=lambda t: t[1])
+
+
+def _write_lines(fh, lines: list):
+    fh.write(("\n".join(lines) + "\n").encode())
+
+
+async def export_partition(parent: str, name: str, archive_dir: str = ARCHIVE_DIR) -> tuple:
+    """Stream a detached partition to <archive_dir>/<parent>/<name>.ndjson.gz; returns (path, rows)."""
+    directory = os.path.join(archive_dir, parent)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.ndjson.gz")
+    tmp_path = path + ".tmp"
+    rows = 0
+    fh = await asyncio.to_thread(gzip.open, tmp_path, "wb")
+    try:
+        async with engine.connect() as conn:
+            result = await conn.stream(text(f'SELECT * FROM "{name}"'))
+            async for chunk in result.mappings().partitions(EXPORT_CHUNK):
+                lines = [json.dumps(dict(row), default=str) for row in chunk]
+                await asyncio.to_thread(_write_lines, fh, lines)
+                rows += len(lines)
+    finally:
+        await asyncio.to_thread(fh.close)
+    await asyncio.to_thread(os.replace, tmp_path, path)
+    return path, rows
+
+
+async def archive_partitions(retention_months: int = PARTITION_RETENTION_MONTHS,
+                             archive_dir: str = ARCHIVE_DIR, today: date = None) -> list:
+    """Detach expired partitions and export + drop every detached one. Returns what was archived."""
+    cutoff = retention_cutoff(today or date.today(), retention_months)
+    archived = []
+    for parent in PARTITIONED_TABLES:
+        for name, month, attached in await _monthly_tables(parent):
+            if attached:
+                if month >= cutoff:
+                    continue
+                async with engine.begin() as conn:
+                    await conn.execute(text(f'ALTER TABLE "{parent}" DETACH PARTITION "{name}"'))
+            try:
+                path, rows = await export_partition(parent, name, archive_dir)
+            except Exception as e:
+                print(f"[Retention] export of {name} failed, keeping it detached: {e}")
+                continue
+            async with engine.begin() as conn:
+                await conn.execute(text(f'DROP TABLE "{name}"'))
+            archived.append({"partition": name, "rows": rows, "path": path})
+    return archived
+
+
+async def run_retention_job(interval: float = RETENTION_JOB_INTERVAL):
+    while True:
+        try:
+            async with engine.begin() as conn:
+                created = await ensure_partitions(conn)
+            archived = await archive_partitions() if PARTITION_RETENTION_MONTHS > 0 else []
+            print(f"[Retention] created {created} partitions, archived {len(archived)}")
+        except Exception as e:
+            print(f"[Retention] run failed: {e}")
+        await asyncio.sleep(interval)
@@ -1,22 +1,50 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-import socketio
+import socketio, asyncio
 from contextlib import asynccontextmanager
 
-from websocket.events import sio
+from websocket.events import sio, chat_ingress
 from routers import auth, patients, chat, risk, interventions, dashboard
 from routers.chat import set_sio
-from database import init_db
+from database import init_db, pool_metrics, dispose_engines
+from persistence import chat_writes
+from storage import shutdown_storage
+from transcription import warmup_transcriber, close_transcriber, transcriber_stats
+from tts import presynthesize_fallbacks, tts_stats
+from pagination import CURSOR_HEADERS
+from auth import require_admin
+from agents.executor import stage_stats, shutdown_stages
+from agents.pool import pool_stats, warm_pools
+from agents.cache import cache_stats
+from agents.detection import tier_stats
+from jobs.predictions import run_prediction_job, PREDICTION_JOB_INTERVAL
+from jobs.retention import run_retention_job, RETENTION_JOB_INTERVAL
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
     set_sio(sio)
+    chat_writes.start()
+    pool_warmup = asyncio.create_task(warm_pools())
+    transcriber_warmup = asyncio.create_task(warmup_transcriber())
+    tts_presynthesis = asyncio.create_task(presynthesize_fallbacks())
+    prediction_job = asyncio.create_task(run_prediction_job()) if PREDICTION_JOB_INTERVAL > 0 else None
+    retention_job = asyncio.create_task(run_retention_job()) if RETENTION_JOB_INTERVAL > 0 else None
     yield
+    for job in (pool_warmup, transcriber_warmup, tts_presynthesis, prediction_job, retention_job):
+        if job:
+            job.cancel()
+    shutdown_stages()
+    await chat_writes.close()
+    await close_transcriber()
+    shutdown_storage()
+    await dispose_engines()
 
 
-app = FastAPI(title="MindGuard Pro API", version="1.0.0", lifespan=lifespan)
+app = FastAPI(title="MindGuard Pro API", version="1.0.0", lifespan=lifespan,
+              default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +52,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=CURSOR_HEADERS + ["Server-Timing"],
 )
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
@@ -39,6 +68,27 @@ async def root():
     return {"message": "MindGuard Pro API", "version": "1.0.0", "docs": "/docs"}
 
 
+@app.get("/metrics/agents", dependencies=[Depends(require_admin)])
+async def agent_metrics():
+    return {"stages": stage_stats(), "pools": pool_stats(), "caches": cache_stats(),
+            "detection_tiers": tier_stats()}
+
+
+@app.get("/metrics/db", dependencies=[Depends(require_admin)])
+async def db_metrics():
+    return {**pool_metrics(), "write_behind": chat_writes.stats()}
+
+
+@app.get("/metrics/socket", dependencies=[Depends(require_admin)])
+async def socket_metrics():
+    return {"chat_ingress": chat_ingress.stats()}
+
+
+@app.get("/metrics/voice", dependencies=[Depends(require_admin)])
+async def voice_metrics():
+    return {"transcription": transcriber_stats(), "tts": tts_stats()}
+
+
 # Mount Socket.io
 socket_app = socketio.ASGIApp(sio, app)
 
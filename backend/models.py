@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, JSON, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, Float, JSON, Date, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from pydantic import BaseModel
@@ -23,12 +23,17 @@ class Clinician(Base):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (Index("ix_users_clinician_id", "clinician_id"),)
     id = Column(String, primary_key=True)
     name = Column(String)
     age = Column(Integer)
     clinician_id = Column(String, ForeignKey("clinicians.id"))
     emergency_contact = Column(String)
     created_at = Column(DateTime)
+    # Denormalized from the newest risk_history row; written alongside it in chat.send_message
+    latest_risk_score = Column(Float, nullable=True)
+    latest_risk_level = Column(String, nullable=True)
+    last_active_at = Column(DateTime, nullable=True)
     clinician = relationship("Clinician", back_populates="patients", foreign_keys="[User.clinician_id]")
     sessions = relationship("Session", back_populates="user")
     risk_history = relationship("RiskHistory", back_populates="user")
@@ -37,6 +42,7 @@ class User(Base):
 
 class Session(Base):
     __tablename__ = "sessions"
+    __table_args__ = (Index("ix_sessions_user_start_time_id", "user_id", "start_time", "id"),)
     id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey("users.id"))
     start_time = Column(DateTime)
@@ -49,6 +55,10 @@ class Session(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_session_timestamp_id", "session_id", "timestamp", "id"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
     id = Column(String, primary_key=True)
     session_id = Column(String, ForeignKey("sessions.id"))
     sender = Column(String)
@@ -56,24 +66,52 @@ class Message(Base):
     audio_url = Column(String, nullable=True)
     risk_score = Column(Float, nullable=True)
     triggered_signals = Column(JSON, nullable=True)
-    timestamp = Column(DateTime)
+    timestamp = Column(DateTime, primary_key=True)  # partition key, so part of the primary key
     session = relationship("Session", back_populates="messages")
 
 
 class RiskHistory(Base):
     __tablename__ = "risk_history"
+    __table_args__ = (
+        Index("ix_risk_history_user_date_id", "user_id", "date", "id"),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
     id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey("users.id"))
     score = Column(Float)
     risk_level = Column(String)
     factors = Column(JSON)
     predicted_score = Column(Float, nullable=True)
-    date = Column(DateTime)
+    date = Column(DateTime, primary_key=True)  # partition key, so part of the primary key
     user = relationship("User", back_populates="risk_history")
 
 
+class RiskDailyRollup(Base):
+    """Per-patient per-day risk aggregates, updated on every RiskHistory write."""
+    __tablename__ = "risk_daily_rollup"
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, default=0)
+    score_sum = Column(Float, default=0.0)
+    max_score = Column(Float, default=0.0)
+    crisis_count = Column(Integer, default=0)
+
+
+class RiskPrediction(Base):
+    __tablename__ = "risk_predictions"
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    crisis_probability = Column(Integer)
+    confidence = Column(Float)
+    time_window = Column(String, default="72hrs")
+    driving_factors = Column(JSON)
+    recommendation = Column(String)
+    history_points = Column(Integer)
+    computed_at = Column(DateTime)
+
+
 class Intervention(Base):
     __tablename__ = "interventions"
+    __table_args__ = (Index("ix_interventions_user_timestamp_id", "user_id", "timestamp", "id"),)
     id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey("users.id"))
     type = Column(String)
@@ -117,3 +155,8 @@ class InterventionRequest(BaseModel):
 class RiskAnalyzeRequest(BaseModel):
     user_id: str
     message: str
+
+class RiskAnalyzeBatchRequest(BaseModel):
+    messages: List[str]
+    use_llm: bool = True
+    concurrency: Optional[int] = None
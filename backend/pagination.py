@@ -0,0 +1,78 @@
+"""
+Keyset pagination on (timestamp, id) for the time-ordered list endpoints.
+
+Endpoints keep returning a plain JSON list; cursors for the neighbouring pages
+are sent in the X-Before-Cursor / X-After-Cursor response headers and passed
+back as the `before` / `after` query parameters.
+"""
+import base64, os
+from datetime import datetime
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+CURSOR_HEADERS = ["X-Before-Cursor", "X-After-Cursor"]
+
+
+def encode_cursor(ts: datetime, row_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), row_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def _row_cursor(row, ts_col, id_col) -> str:
+    return encode_cursor(getattr(row, ts_col.key), getattr(row, id_col.key))
+
+
+async def fetch_page(
+    db: AsyncSession, query, ts_col, id_col, response: Response,
+    before: str = None, after: str = None, limit: int = DEFAULT_PAGE_SIZE,
+    newest_first: bool = True, start_at_newest: bool = True,
+) -> list:
+    """Run `query` for one page of rows ordered by (ts_col, id_col) and set the cursor headers.
+
+    `query` is a column-projected select that includes both key columns.
+
+    `before` returns rows older than the cursor, `after` rows newer than it; with
+    neither, the page starts at the newest or oldest row per `start_at_newest`.
+    Rows come back newest-first or oldest-first per `newest_first`.
+    Rows with a NULL ts_col have no position in the keyset and are left out.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Pass either before or after, not both")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    key = tuple_(ts_col, id_col)
+    # A NULL key can't be encoded in a cursor and never matches the row comparison
+    query = query.where(ts_col.is_not(None))
+
+    walking_back = bool(before) or (not after and start_at_newest)
+    if before:
+        query = query.where(key < tuple_(*decode_cursor(before)))
+    elif after:
+        query = query.where(key > tuple_(*decode_cursor(after)))
+    order = (ts_col.desc(), id_col.desc()) if walking_back else (ts_col.asc(), id_col.asc())
+    rows = (await db.execute(query.order_by(*order).limit(limit + 1))).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        oldest, newest = (rows[-1], rows[0]) if walking_back else (rows[0], rows[-1])
+        # More rows lie beyond the page in the walking direction if we over-fetched;
+        # behind it, only if we started from a cursor
+        if (has_more if walking_back else bool(after)):
+            response.headers["X-Before-Cursor"] = _row_cursor(oldest, ts_col, id_col)
+        if (bool(before) if walking_back else has_more):
+            response.headers["X-After-Cursor"] = _row_cursor(newest, ts_col, id_col)
+    if walking_back != newest_first:
+        rows.reverse()
+    return rows
@@ -0,0 +1,82 @@
+"""
+Monthly range partitioning for messages and risk_history.
+
+Both tables are partitioned on their timestamp column with one partition per
+calendar month (<table>_pYYYY_MM) plus a DEFAULT partition for out-of-range
+rows. ensure_monthly_partitions() is installed in the database so the app,
+create_tables.py and the retention job all create partitions the same way.
+"""
+import os
+from sqlalchemy import text
+
+# parent table -> partition key
+PARTITIONED_TABLES = {"messages": "timestamp", "risk_history": "date"}
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+ENSURE_PARTITIONS_FN = """
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(parent TEXT, from_month DATE, to_month DATE)
+RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    m       DATE := date_trunc('month', from_month)::date;
+    name    TEXT;
+    created INTEGER := 0;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(parent)) THEN
+        RETURN 0;
+    END IF;
+    WHILE m <= to_month LOOP
+        name := format('%s_p%s', parent, to_char(m, 'YYYY_MM'));
+        IF to_regclass(name) IS NULL THEN
+            BEGIN
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                               name, parent, m, (m + interval '1 month')::date);
+                created := created + 1;
+            EXCEPTION
+                WHEN duplicate_table THEN NULL;  -- created concurrently by another worker
+                WHEN check_violation THEN        -- rows for this month already sit in the default partition
+                    RAISE WARNING 'skipping partition %: default partition holds rows in range', name;
+            END;
+        END IF;
+        m := (m + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END $$
+"""
+
+
+def default_partition_sql(parent: str) -> str:
+    # Guarded so it is a no-op on a not-yet-migrated plain table
+    return f"""
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('{parent}')) THEN
+        CREATE TABLE IF NOT EXISTS {parent}_default PARTITION OF {parent} DEFAULT;
+    END IF;
+END $$
+"""
+
+
+def ensure_partitions_sql(parent: str, months_back: int = 0, months_ahead: int = PARTITION_MONTHS_AHEAD) -> str:
+    """SELECT that creates any missing monthly partitions from `months_back` before to `months_ahead` after now."""
+    return (
+        f"SELECT ensure_monthly_partitions('{parent}', "
+        f"(date_trunc('month', now()) - interval '{int(months_back)} months')::date, "
+        f"(date_trunc('month', now()) + interval '{int(months_ahead)} months')::date)"
+    )
+
+
+def partition_setup_statements(months_back: int = 1) -> list:
+    """Install the partition function, default partitions and partitions around the current month."""
+    statements = [ENSURE_PARTITIONS_FN]
+    for parent in PARTITIONED_TABLES:
+        statements.append(default_partition_sql(parent))
+        statements.append(ensure_partitions_sql(parent, months_back))
+    return statements
+
+
+async def ensure_partitions(conn, months_back: int = 0) -> int:
+    """Create upcoming monthly partitions on an async connection; returns how many were created."""
+    created = 0
+    for parent in PARTITIONED_TABLES:
+        created += (await conn.execute(text(ensure_partitions_sql(parent, months_back)))).scalar() or 0
+    return created
@@ -0,0 +1,241 @@
+"""
+Write-behind buffer for the chat persistence path.
+
+Concurrent chat requests hand their rows to one flusher task instead of each
+committing its own transaction. The flusher writes everything queued within
+WRITE_BEHIND_INTERVAL_MS (or as soon as WRITE_BEHIND_MAX_BATCH writes are
+waiting) in a single transaction of multi-row INSERTs and batched UPDATEs.
+Each caller gets a future that resolves once its rows are committed, so a
+response is only sent after its data is durable.
+"""
+import asyncio, os, time, uuid
+from datetime import datetime
+from sqlalchemy import bindparam, or_
+from sqlalchemy.dialects.postgresql import insert
+from database import AsyncSessionLocal
+from models import Message, RiskHistory, Intervention, User, Session as DBSession
+from rollups import daily_rollup_rows, upsert_daily_rollups
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() != "false"
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "10")) / 1000
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "200"))
+# Bound on queued writes; submitters wait for room once it is reached
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+
+_sessions = DBSession.__table__
+_users = User.__table__
+
+_update_session_score = (
+    _sessions.update()
+    .where(_sessions.c.id == bindparam("b_id"))
+    .values(overall_risk_score=bindparam("b_score"))
+)
+
+# The guard stops an older reading from overwriting a newer one
+_update_user_latest = (
+    _users.update()
+    .where(_users.c.id == bindparam("b_id"),
+           or_(_users.c.last_active_at.is_(None), _users.c.last_active_at <= bindparam("b_at")))
+    .values(latest_risk_score=bindparam("b_score"), latest_risk_level=bindparam("b_level"),
+            last_active_at=bindparam("b_at"))
+)
+
+
+def intervention_rows(user_id: str, actions: list, at: datetime) -> list:
+    """Intervention rows for the actions a chat turn's intervention step took."""
+    return [
+        {"id": str(uuid.uuid4()), "user_id": user_id, "type": action.split(":")[0],
+         "triggered_by": "agent", "outcome": "fired", "timestamp": at}
+        for action in actions
+    ]
+
+
+class ChatWrite:
+    """Rows produced by one chat turn. `risk_history` also drives the session, user and rollup updates;
+    it is None for writes that only carry interventions which finished after their turn."""
+    __slots__ = ("session_id", "messages", "risk_history", "interventions", "new_session")
+
+    def __init__(self, session_id: str, messages: list, risk_history: dict = None,
+                 interventions: list = (), new_session: dict = None):
+        self.session_id = session_id
+        self.messages = messages
+        self.risk_history = risk_history
+        self.interventions = list(interventions)
+        self.new_session = new_session
+
+
+async def _write_batch(db, writes: list):
+    new_sessions = {w.new_session["id"]: w.new_session for w in writes if w.new_session}
+    if new_sessions:
+        await db.execute(insert(DBSession).on_conflict_do_nothing(index_elements=[DBSession.id]),
+                         list(new_sessions.values()))
+
+    messages = [m for w in writes for m in w.messages]
+    if messages:
+        await db.execute(insert(Message), messages)
+    interventions = [i for w in writes for i in w.interventions]
+    if interventions:
+        await db.execute(insert(Intervention), interventions)
+    writes = [w for w in writes if w.risk_history]
+    if not writes:
+        return
+    await db.execute(insert(RiskHistory), [w.risk_history for w in writes])
+
+    # Collapse to one update per session / user: the latest reading wins
+    session_scores, user_latest = {}, {}
+    for w in writes:
+        rh = w.risk_history
+        session_scores[w.session_id] = rh["score"]
+        current = user_latest.get(rh["user_id"])
+        if current is None or current["date"] <= rh["date"]:
+            user_latest[rh["user_id"]] = rh
+    await db.execute(_update_session_score,
+                     [{"b_id": sid, "b_score": score} for sid, score in session_scores.items()])
+    await db.execute(_update_user_latest, [
+        {"b_id": uid, "b_score": rh["score"], "b_level": rh["risk_level"], "b_at": rh["date"]}
+        for uid, rh in user_latest.items()
+    ])
+    await upsert_daily_rollups(db, daily_rollup_rows(
+        (w.risk_history["user_id"], w.risk_history["score"], w.risk_history["risk_level"], w.risk_history["date"])
+        for w in writes
+    ))
+
+
+class WriteBehindBuffer:
+    """Group-commits ChatWrites from concurrent requests on a single flusher task."""
+
+    def __init__(self, interval: float = WRITE_BEHIND_INTERVAL, max_batch: int = WRITE_BEHIND_MAX_BATCH,
+                 max_pending: int = WRITE_BEHIND_MAX_PENDING, enabled: bool = WRITE_BEHIND_ENABLED):
+        self.interval = interval
+        self.max_batch = max(1, max_batch)
+        self.max_pending = max_pending
+        self.enabled = enabled
+        self._queue = None
+        self._task = None
+        self._closing = False
+        self._batches = 0
+        self._writes = 0
+        self._largest_batch = 0
+        self._failed_writes = 0
+        self._batch_retries = 0
+        self._last_flush_ms = 0.0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, write: ChatWrite):
+        """Queue `write` and wait until it is committed. Raises if its rows could not be written."""
+        if not self.enabled or self._closing:
+            await self._flush([(write, None)])
+            return
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((write, future))
+        if self._closing and self._task.done():
+            # Room opened up only after the flusher stopped; nothing else will pick this up
+            leftover = self._drain_remaining()
+            if leftover:
+                await self._flush(leftover)
+        # Shielded: a caller giving up must not cancel the ack other code may rely on
+        await asyncio.shield(future)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.interval
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                # Submitters blocked on a full queue can land behind the sentinel
+                while leftover := self._drain_remaining():
+                    await self._flush(leftover)
+                return
+
+    def _drain_remaining(self) -> list:
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return items
+            if item is not None:
+                items.append(item)
+
+    async def _flush(self, batch: list):
+        start = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                await _write_batch(db, [w for w, _ in batch])
+                await db.commit()
+            errors = [None] * len(batch)
+        except Exception:
+            # Isolate the failing write(s) so one bad row doesn't fail the whole group
+            self._batch_retries += 1
+            errors = [await self._write_one(w) for w, _ in batch]
+        self._batches += 1
+        self._writes += len(batch)
+        self._largest_batch = max(self._largest_batch, len(batch))
+        self._last_flush_ms = (time.perf_counter() - start) * 1000
+
+        for (_, future), error in zip(batch, errors):
+            if error is not None:
+                self._failed_writes += 1
+            if future is None:
+                if error is not None:
+                    raise error
+            elif not future.done():
+                future.set_exception(error) if error is not None else future.set_result(None)
+
+    async def _write_one(self, write: ChatWrite):
+        try:
+            async with AsyncSessionLocal() as db:
+                await _write_batch(db, [write])
+                await db.commit()
+        except Exception as e:
+            print(f"[WriteBehind] write for session {write.session_id} failed: {e}")
+            return e
+        return None
+
+    async def close(self):
+        """Stop accepting queued writes and flush everything already buffered."""
+        self._closing = True
+        if self._task and not self._task.done():
+            await self._queue.put(None)
+            await self._task
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "interval_ms": self.interval * 1000,
+            "max_batch": self.max_batch,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "batches": self._batches,
+            "writes": self._writes,
+            "avg_batch": round(self._writes / self._batches, 2) if self._batches else 0.0,
+            "largest_batch": self._largest_batch,
+            "batch_retries": self._batch_retries,
+            "failed_writes": self._failed_writes,
+            "last_flush_ms": round(self._last_flush_ms, 3),
+        }
+
+
+chat_writes = WriteBehindBuffer()
@@ -0,0 +1,49 @@
+"""
+Incremental maintenance of risk_daily_rollup, which backs dashboard analytics
+so they never scan raw risk_history.
+"""
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import RiskDailyRollup
+
+CRISIS_LEVELS = ("CRISIS", "IMMINENT")
+
+
+def daily_rollup_rows(readings) -> list:
+    """Aggregate (user_id, score, risk_level, at) readings into one increment row per patient/day."""
+    rows = {}
+    for user_id, score, risk_level, at in readings:
+        key = (user_id, at.date())
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = {"user_id": user_id, "day": key[1], "count": 0, "score_sum": 0.0,
+                               "max_score": score, "crisis_count": 0}
+        row["count"] += 1
+        row["score_sum"] += score
+        row["max_score"] = max(row["max_score"], score)
+        row["crisis_count"] += 1 if risk_level in CRISIS_LEVELS else 0
+    return list(rows.values())
+
+
+async def upsert_daily_rollups(db: AsyncSession, rows: list):
+    """Add pre-aggregated increment rows to their rollups. Runs in the caller's transaction."""
+    if not rows:
+        return
+    stmt = insert(RiskDailyRollup).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RiskDailyRollup.user_id, RiskDailyRollup.day],
+        set_={
+            "count": RiskDailyRollup.count + stmt.excluded.count,
+            "score_sum": RiskDailyRollup.score_sum + stmt.excluded.score_sum,
+            "max_score": func.greatest(RiskDailyRollup.max_score, stmt.excluded.max_score),
+            "crisis_count": RiskDailyRollup.crisis_count + stmt.excluded.crisis_count,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def record_daily_risk(db: AsyncSession, user_id: str, score: float, risk_level: str, at: datetime):
+    """Fold one risk reading into its patient/day rollup row. Runs in the caller's transaction."""
+    await upsert_daily_rollups(db, daily_rollup_rows([(user_id, score, risk_level, at)]))
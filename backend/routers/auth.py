@@ -16,7 +16,7 @@ async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
     clinician = result.scalars().first()
     if not clinician or not verify_password(request.password, clinician.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    token = create_access_token({"sub": clinician.id, "email": clinician.email})
+    token = create_access_token({"sub": clinician.id, "email": clinician.email, "role": clinician.role or "user"})
     return TokenResponse(
         access_token=token, clinician_id=clinician.id, name=clinician.name,
         role=clinician.role or "user", user_id=clinician.user_id
@@ -59,7 +59,7 @@ async def register(request: RegisterRequest, db: AsyncSession = Depends(get_db))
     )
     db.add(clinician)
     await db.commit()
-    token = create_access_token({"sub": clinician.id, "email": clinician.email})
+    token = create_access_token({"sub": clinician.id, "email": clinician.email, "role": clinician.role})
     return TokenResponse(
         access_token=token, clinician_id=clinician.id, name=clinician.name,
         role=clinician.role, user_id=clinician.user_id
@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse, FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, desc, inspect
 from database import get_db
-from models import ChatRequest, User, Session as DBSession, Message, RiskHistory, Intervention, Clinician
-from agents.orchestrator import process_message
-from aws_config import upload_to_s3, _aws_session
-from datetime import datetime, timezone
-import uuid, os, io
+from persistence import chat_writes, ChatWrite, intervention_rows
+from pagination import fetch_page, DEFAULT_PAGE_SIZE
+from serialization import json_response, rows_as_dicts
+from models import ChatRequest, User, Session as DBSession, Message, RiskHistory, Clinician
+from agents.orchestrator import process_message, process_message_stream
+from agents.memory import TREND_WINDOW, get_trend, seed_trend, record_risk_score
+from storage import get_storage, SharedUpload, S3Storage
+from transcription import get_transcriber
+from tts import get_synthesizer, AUDIO_KEY_RE
+from typing import Optional
+from datetime import datetime, timezone, timedelta
+import asyncio, uuid, os, io, json, time
 
 router = APIRouter()
 _sio = None
@@ -17,11 +24,7 @@ def set_sio(sio_instance):
     _sio = sio_instance
 
 
-@router.post("/message")
-async def send_message(
-    request: ChatRequest,
-    db: AsyncSession = Depends(get_db)
-):
+async def _load_context(request: ChatRequest, db: AsyncSession):
     # Get patient info
     user_result = await db.execute(select(User).where(User.id == request.user_id))
     user = user_result.scalars().first()
@@ -35,76 +38,72 @@ async def send_message(
         if clinician:
             clinician_phone = clinician.phone or ""
 
-    # Get risk history
-    rh_result = await db.execute(
-        select(RiskHistory).where(RiskHistory.user_id == request.user_id)
-        .order_by(RiskHistory.date).limit(14)
-    )
-    risk_history = [{"score": r.score} for r in rh_result.scalars().all()]
+    # Get the patient's running trend window; only hit risk_history the first time we see them
+    trend = get_trend(request.user_id)
+    if trend is None:
+        rh_result = await db.execute(
+            select(RiskHistory.score).where(RiskHistory.user_id == request.user_id)
+            .order_by(desc(RiskHistory.date)).limit(TREND_WINDOW + 1)
+        )
+        trend = seed_trend(request.user_id, list(reversed(rh_result.scalars().all())))
 
     # Ensure session exists
     sess_result = await db.execute(select(DBSession).where(DBSession.id == request.session_id))
     session = sess_result.scalars().first()
     if not session:
+        # Left transient; the write-behind buffer inserts it with the turn's first rows
         session = DBSession(
             id=request.session_id, user_id=request.user_id,
             start_time=datetime.utcnow(), overall_risk_score=0.0, status="active"
         )
-        db.add(session)
-        await db.flush()
 
-    # Run agent pipeline
-    result = await process_message(
+    # Hand the connection back before the pipeline runs; writes go through the write-behind buffer
+    await db.commit()
+
+    pipeline_kwargs = dict(
         user_id=request.user_id,
         session_id=request.session_id,
         message=request.message,
         patient_name=user.name,
         clinician_phone=clinician_phone,
         emergency_contact=user.emergency_contact or "",
-        risk_history=risk_history
+        trend=trend
     )
+    return user, session, pipeline_kwargs
+
 
+async def _persist_and_broadcast(request: ChatRequest, user: User, session: DBSession, result: dict):
     now = datetime.utcnow()
     risk = result["risk"]
 
-    # Save user message
-    db.add(Message(
-        id=str(uuid.uuid4()), session_id=request.session_id,
-        sender="user", text=request.message,
-        risk_score=risk["overall_risk_score"],
-        triggered_signals=risk.get("triggered_signals"),
-        timestamp=now
-    ))
-
-    # Save agent reply
-    db.add(Message(
-        id=str(uuid.uuid4()), session_id=request.session_id,
-        sender="agent", text=result["agent_reply"],
-        timestamp=now
-    ))
+    new_session = None
+    if inspect(session).transient:
+        new_session = {"id": session.id, "user_id": session.user_id, "start_time": session.start_time,
+                       "overall_risk_score": 0.0, "status": session.status}
 
-    # Save risk history
-    db.add(RiskHistory(
-        id=str(uuid.uuid4()), user_id=request.user_id,
-        score=risk["overall_risk_score"],
-        risk_level=risk["risk_level"],
-        factors={"signals": risk.get("triggered_signals", [])},
-        predicted_score=result["prediction"].get("crisis_probability"),
-        date=now
+    # Rows are group-committed with other in-flight chat turns; this returns once ours are durable
+    await chat_writes.submit(ChatWrite(
+        session_id=request.session_id,
+        new_session=new_session,
+        messages=[
+            {"id": str(uuid.uuid4()), "session_id": request.session_id, "sender": "user",
+             "text": request.message, "risk_score": risk["overall_risk_score"],
+             "triggered_signals": risk.get("triggered_signals"), "timestamp": now},
+            # A microsecond later so keyset pagination (timestamp, random id) always puts the reply second
+            {"id": str(uuid.uuid4()), "session_id": request.session_id, "sender": "agent",
+             "text": result["agent_reply"], "risk_score": None, "triggered_signals": None,
+             "timestamp": now + timedelta(microseconds=1)},
+        ],
+        risk_history={
+            "id": str(uuid.uuid4()), "user_id": request.user_id,
+            "score": risk["overall_risk_score"], "risk_level": risk["risk_level"],
+            "factors": {"signals": risk.get("triggered_signals", [])},
+            "predicted_score": result["prediction"].get("crisis_probability"),
+            "date": now,
+        },
+        interventions=intervention_rows(request.user_id, result.get("actions_taken", []), now),
     ))
-
-    # Update session risk score
-    session.overall_risk_score = risk["overall_risk_score"]
-
-    # Save interventions
-    for action in result.get("actions_taken", []):
-        db.add(Intervention(
-            id=str(uuid.uuid4()), user_id=request.user_id,
-            type=action.split(":")[0], triggered_by="agent",
-            outcome="fired", timestamp=now
-        ))
-
-    await db.commit()
+    record_risk_score(request.user_id, risk["overall_risk_score"])
 
     # Broadcast via WebSocket
     if _sio:
@@ -129,110 +128,208 @@ async def send_message(
                 "risk_level": risk["risk_level"],
             })
 
+
+async def run_chat_turn(request: ChatRequest, db: AsyncSession) -> dict:
+    """One chat turn: agent pipeline, persistence and dashboard broadcasts. Shared with Socket.IO ingress."""
+    user, session, pipeline_kwargs = await _load_context(request, db)
+
+    # Run agent pipeline
+    result = await process_message(**pipeline_kwargs)
+
+    await _persist_and_broadcast(request, user, session, result)
     return result
 
 
+@router.post("/message")
+async def send_message(
+    request: ChatRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    return await run_chat_turn(request, db)
+
+
+# Socket.IO events for each streamed pipeline event, sent to the session room only
+_STREAM_SIO_EVENTS = {
+    "risk": "risk_detected",
+    "reply_chunk": "reply_chunk",
+    "prediction": "prediction_ready",
+    "intervention": "intervention_update",
+}
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/message/stream")
+async def send_message_stream(
+    request: ChatRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Run the chat pipeline and stream reply chunks as Server-Sent Events.
+
+    The session_{id} Socket.IO room receives the same events as they happen;
+    the final "done" event carries the same payload as POST /message.
+    """
+    user, session, pipeline_kwargs = await _load_context(request, db)
+    room = f"session_{request.session_id}"
+
+    async def event_stream():
+        async for event, data in process_message_stream(**pipeline_kwargs):
+            if event == "done":
+                await _persist_and_broadcast(request, user, session, data)
+            elif _sio:
+                await _sio.emit(_STREAM_SIO_EVENTS[event], {"session_id": request.session_id, **data}, room=room)
+            yield _sse(event, data)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+class _StageTimer:
+    """Wall-clock time per stage of one request, rendered as a Server-Timing header."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    async def run(self, name: str, awaitable):
+        t0 = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.stages[name] = (time.perf_counter() - t0) * 1000
+
+    def header(self) -> str:
+        stages = {**self.stages, "total": (time.perf_counter() - self.start) * 1000}
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in stages.items())
+
+
+async def _archive_voice(storage, key: str, shared: SharedUpload, content_type: str) -> str | None:
+    try:
+        return (await storage.upload_stream(key, shared.chunks(), content_type)).url
+    except Exception as e:
+        print(f"[Storage] voice upload failed: {e}")
+        return None
+
+
 @router.post("/voice")
 async def send_voice(
     user_id: str,
     session_id: str,
+    request: Request,
+    response: Response,
     audio: UploadFile = File(...),
     db: AsyncSession = Depends(get_db)
 ):
-    audio_bytes = await audio.read()
-    s3_key = f"voice/{user_id}/{uuid.uuid4()}.webm"
-    audio_url = None
-
-    # Upload to S3
+    """Voice turn: archive + transcribe, chat pipeline, then synthesis alongside persistence.
+
+    Stages overlap wherever their inputs allow; per-stage wall-clock times are
+    returned in the Server-Timing header.
+    """
+    timer = _StageTimer()
+    storage = get_storage()
+    shared = SharedUpload(audio)
+    filename = audio.filename or "audio.webm"
+
+    req = ChatRequest(user_id=user_id, session_id=session_id, message="")
+    upload = transcription = synthesis = None
     try:
-        audio_url = await upload_to_s3(audio_bytes, s3_key, audio.content_type or "audio/webm")
-    except Exception:
-        pass
-
-    # Transcribe via Amazon Transcribe
-    text = await _transcribe(audio_bytes, audio.filename or "audio.webm", s3_url=audio_url)
-
-    req = ChatRequest(user_id=user_id, session_id=session_id, message=text)
-    result = await send_message(req, db)
+        # Archive the upload while it is being transcribed; both read the same spooled file
+        upload = asyncio.create_task(timer.run("upload", _archive_voice(
+            storage, f"voice/{user_id}/{uuid.uuid4()}.webm", shared, audio.content_type or "audio/webm")))
+        if _transcriber_reads_from_s3() and isinstance(storage, S3Storage):
+            # Batch Transcribe reads the archived object, so it has to wait for it
+            transcription = asyncio.create_task(timer.run("transcribe", _transcribe_after(upload, shared, filename)))
+        else:
+            transcription = asyncio.create_task(timer.run("transcribe", _transcribe(shared.chunks(), filename)))
+
+        # Patient and session lookups don't depend on the transcript
+        user, session, pipeline_kwargs = await timer.run("context", _load_context(req, db))
+        req.message = pipeline_kwargs["message"] = await transcription
+
+        result = await timer.run("pipeline", process_message(**pipeline_kwargs))
+
+        # Synthesis only needs the reply text; run it alongside the commit and broadcasts
+        synthesis = asyncio.create_task(timer.run("synthesize", _synthesize(result["agent_reply"])))
+        await timer.run("persist", _persist_and_broadcast(req, user, session, result))
+
+        audio_url = await upload
+        key = await synthesis
+    except BaseException:
+        for task in (upload, transcription, synthesis):
+            if task is not None:
+                task.cancel()
+        raise
 
     # Attach S3 URL to the last user message
     if audio_url:
         result["audio_url"] = audio_url
-
-    # Synthesize agent reply to speech via AWS Polly
-    result["audio_reply"] = await _synthesize(result["agent_reply"])
+    result["audio_reply_url"] = str(request.url_for("get_reply_audio", key=key)) if key else None
+    response.headers["Server-Timing"] = timer.header()
     return result
 
 
 async def _synthesize(text: str) -> str | None:
-    """Convert text to speech via AWS Polly, return base64 MP3."""
+    """Convert text to speech via AWS Polly (cached), return the audio key."""
     try:
-        import base64
-        polly = _aws_session.client("polly", region_name=os.getenv("AWS_REGION", "us-east-1"))
-        resp = polly.synthesize_speech(
-            Text=text[:3000],
-            OutputFormat="mp3",
-            VoiceId="Joanna",
-            Engine="neural",
-        )
-        audio_bytes = resp["AudioStream"].read()
-        return base64.b64encode(audio_bytes).decode()
-    except Exception:
+        return await get_synthesizer().synthesize(text)
+    except Exception as e:
+        print(f"[TTS] error: {e}")
         return None
 
 
-async def _transcribe(audio_bytes: bytes, filename: str, s3_url: str | None = None) -> str:
-    """Transcribe audio using Amazon Transcribe."""
-    import asyncio
+@router.get("/audio/{key}.mp3")
+async def get_reply_audio(key: str):
+    path = get_synthesizer().cache.get(key) if AUDIO_KEY_RE.fullmatch(key) else None
+    if not path:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    # Content-addressed, so the bytes behind a URL never change
+    return FileResponse(path, media_type="audio/mpeg",
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+def _transcriber_reads_from_s3() -> bool:
     try:
-        transcribe = _aws_session.client("transcribe", region_name=os.getenv("AWS_REGION", "us-east-1"))
-        job_name = f"mg-{uuid.uuid4().hex[:16]}"
-
-        # If not already on S3, upload it
-        if not s3_url:
-            key = f"voice/tmp/{job_name}.webm"
-            s3_url = await upload_to_s3(audio_bytes, key, "audio/webm")
-
-        transcribe.start_transcription_job(
-            TranscriptionJobName=job_name,
-            Media={"MediaFileUri": s3_url},
-            MediaFormat="webm",
-            LanguageCode="en-US",
-        )
+        return get_transcriber().reads_from_s3
+    except Exception:
+        # Backend can't be built (e.g. its package isn't installed); _transcribe reports it and falls back
+        return False
 
-        # Poll until complete (max 30s)
-        for _ in range(30):
-            await asyncio.sleep(1)
-            resp = transcribe.get_transcription_job(TranscriptionJobName=job_name)
-            status = resp["TranscriptionJob"]["TranscriptionJobStatus"]
-            if status == "COMPLETED":
-                import urllib.request
-                transcript_uri = resp["TranscriptionJob"]["Transcript"]["TranscriptFileUri"]
-                with urllib.request.urlopen(transcript_uri) as r:
-                    import json as _json
-                    data = _json.loads(r.read())
-                text = data["results"]["transcripts"][0]["transcript"]
-                return text if text.strip() else "I couldn't hear that clearly."
-            if status == "FAILED":
-                break
+
+async def _transcribe(chunks, filename: str, s3_url: str | None = None) -> str:
+    """Transcribe audio with the configured backend (TRANSCRIBE_BACKEND)."""
+    media_format = os.path.splitext(filename)[1].lstrip(".").lower() or "webm"
+    try:
+        text = await get_transcriber().transcribe(chunks, media_format, s3_url=s3_url)
+        if text and text.strip():
+            return text
     except Exception as e:
         print(f"[Transcribe] error: {e}")
     return "I couldn't hear that clearly."
 
 
+async def _transcribe_after(upload: asyncio.Task, shared: SharedUpload, filename: str) -> str:
+    # shield: cancelling the transcription must not cancel the archival upload
+    s3_url = await asyncio.shield(upload)
+    return await _transcribe(shared.chunks(), filename, s3_url=s3_url)
+
+
 @router.get("/session/{session_id}")
 async def get_session_transcript(
     session_id: str,
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(
-        select(Message).where(Message.session_id == session_id)
-        .order_by(Message.timestamp)
+    # Chronological, starting from the first message; page forward with `after`
+    messages = await fetch_page(
+        db, select(Message.id, Message.sender, Message.text, Message.risk_score,
+                   Message.triggered_signals, Message.timestamp)
+        .where(Message.session_id == session_id),
+        Message.timestamp, Message.id, response, before=before, after=after, limit=limit,
+        newest_first=False, start_at_newest=False,
     )
-    messages = result.scalars().all()
-    return [
-        {"id": m.id, "sender": m.sender, "text": m.text,
-         "risk_score": m.risk_score, "triggered_signals": m.triggered_signals,
-         "timestamp": m.timestamp.isoformat() if m.timestamp else None}
-        for m in messages
-    ]
+    return json_response(rows_as_dicts(messages), response)
@@ -1,117 +1,152 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, func
-from database import get_db
-from models import User, RiskHistory, Intervention
-from auth import get_current_clinician
+from sqlalchemy import select, desc, func, and_
+from database import get_read_db
+from models import User, RiskHistory, RiskPrediction, RiskDailyRollup, Intervention
+from auth import AuthContext, get_auth_context
+from jobs.predictions import prediction_as_dict
+from agents.detection import risk_level_for
+from serialization import json_response
 
 router = APIRouter()
 
 
-@router.get("/overview")
-async def get_overview(
-    db: AsyncSession = Depends(get_db),
-    clinician_id: str = Depends(get_current_clinician)
-):
-    # Admin sees all users; filter by clinician_id only if patients are explicitly assigned
-    from models import Clinician
-    clin_result = await db.execute(select(Clinician).where(Clinician.id == clinician_id))
-    clinician = clin_result.scalars().first()
-    if clinician and clinician.role == "admin":
-        result = await db.execute(select(User))
-    else:
-        result = await db.execute(select(User).where(User.clinician_id == clinician_id))
-    patients = result.scalars().all()
-    out = []
-    for p in patients:
-        rh = await db.execute(
-            select(RiskHistory).where(RiskHistory.user_id == p.id)
-            .order_by(desc(RiskHistory.date)).limit(7)
+TREND_POINTS = 7
+
+
+async def _patient_overview(db: AsyncSession, auth: AuthContext, levels: list = None) -> list:
+    """Latest TREND_POINTS risk points for every patient in scope, fetched in a single windowed query."""
+    # Admin sees all users; everyone else only their assigned patients
+    ranked = (
+        select(
+            RiskHistory.user_id, RiskHistory.score, RiskHistory.risk_level, RiskHistory.date,
+            func.row_number().over(partition_by=RiskHistory.user_id, order_by=desc(RiskHistory.date)).label("rn"),
         )
-        history = rh.scalars().all()
+        .where(auth.patient_filter(RiskHistory.user_id))
+        .cte("ranked")
+    )
+    query = (
+        select(User.id, User.name, User.age, ranked.c.score, ranked.c.risk_level, ranked.c.date)
+        .outerjoin(ranked, and_(ranked.c.user_id == User.id, ranked.c.rn <= TREND_POINTS))
+        .where(auth.patient_filter(User.id))
+        .order_by(User.id, ranked.c.rn)
+    )
+    if levels:
+        query = query.where(User.latest_risk_level.in_(levels))
+
+    patients = {}
+    for uid, name, age, score, level, date in (await db.execute(query)).all():
+        p = patients.setdefault(uid, {"id": uid, "name": name, "age": age, "history": []})
+        if date is not None:
+            p["history"].append((score, level, date))
+
+    out = []
+    for p in patients.values():
+        history = p.pop("history")  # newest first
         latest = history[0] if history else None
         trend = "stable"
         if len(history) >= 2:
-            if history[0].score > history[-1].score + 5:
+            if history[0][0] > history[-1][0] + 5:
                 trend = "rising"
-            elif history[0].score < history[-1].score - 5:
+            elif history[0][0] < history[-1][0] - 5:
                 trend = "falling"
         out.append({
-            "id": p.id, "name": p.name, "age": p.age,
-            "risk_score": latest.score if latest else 0,
-            "risk_level": latest.risk_level if latest else "LOW",
+            **p,
+            "risk_score": latest[0] if latest else 0,
+            "risk_level": latest[1] if latest else "LOW",
             "trend": trend,
-            "last_active": latest.date.isoformat() if latest else None,
-            "trend_data": [{"score": h.score, "date": h.date.isoformat()} for h in reversed(history)]
+            "last_active": latest[2] if latest else None,
+            "trend_data": [{"score": s, "date": d} for s, _, d in reversed(history)]
         })
     out.sort(key=lambda x: x["risk_score"], reverse=True)
     return out
 
 
+@router.get("/overview")
+async def get_overview(
+    db: AsyncSession = Depends(get_read_db),
+    auth: AuthContext = Depends(get_auth_context)
+):
+    return json_response(await _patient_overview(db, auth))
+
+
 @router.get("/critical")
 async def get_critical_patients(
-    db: AsyncSession = Depends(get_db),
-    clinician_id: str = Depends(get_current_clinician)
+    db: AsyncSession = Depends(get_read_db),
+    auth: AuthContext = Depends(get_auth_context)
 ):
-    overview = await get_overview(db, clinician_id)
-    return [p for p in overview if p["risk_level"] in ["HIGH", "CRISIS", "IMMINENT"]]
+    return json_response(await _patient_overview(db, auth, levels=["HIGH", "CRISIS", "IMMINENT"]))
+
+
+@router.get("/outreach")
+async def get_outreach_list(
+    min_probability: int = 50,
+    db: AsyncSession = Depends(get_read_db),
+    auth: AuthContext = Depends(get_auth_context)
+):
+    """Patients whose precomputed 72h crisis probability warrants proactive outreach."""
+    query = (
+        select(User.id, User.name, RiskPrediction.crisis_probability, RiskPrediction.time_window,
+               RiskPrediction.confidence, RiskPrediction.driving_factors, RiskPrediction.recommendation,
+               RiskPrediction.computed_at)
+        .join(RiskPrediction, RiskPrediction.user_id == User.id)
+        .where(RiskPrediction.crisis_probability >= min_probability, auth.patient_filter(User.id))
+        .order_by(desc(RiskPrediction.crisis_probability))
+    )
+    result = await db.execute(query)
+    return json_response([{"id": row.id, "name": row.name, **prediction_as_dict(row)} for row in result])
 
 
 @router.get("/analytics")
 async def get_analytics(
-    db: AsyncSession = Depends(get_db),
-    clinician_id: str = Depends(get_current_clinician)
+    db: AsyncSession = Depends(get_read_db),
+    auth: AuthContext = Depends(get_auth_context)
 ):
-    from models import Clinician
-    clin_result = await db.execute(select(Clinician).where(Clinician.id == clinician_id))
-    clinician = clin_result.scalars().first()
-    if clinician and clinician.role == "admin":
-        patients_result = await db.execute(select(User))
+    # Admins aggregate over everything unfiltered; clinicians over their bounded patient list
+    if auth.patient_ids is None:
+        total_patients = (await db.execute(select(func.count(User.id)))).scalar()
     else:
-        patients_result = await db.execute(select(User).where(User.clinician_id == clinician_id))
-    patient_ids = [p.id for p in patients_result.scalars().all()]
+        total_patients = len(auth.patient_ids)
 
-    if not patient_ids:
+    if not total_patients:
         return {"crisis_events": 0, "avg_risk": 0, "intervention_outcomes": {}, "top_signals": []}
 
-    # Crisis events count
-    crisis_result = await db.execute(
-        select(func.count(RiskHistory.id)).where(
-            RiskHistory.user_id.in_(patient_ids),
-            RiskHistory.risk_level.in_(["CRISIS", "IMMINENT"])
-        )
-    )
-    crisis_count = crisis_result.scalar() or 0
-
-    # Average risk
-    avg_result = await db.execute(
-        select(func.avg(RiskHistory.score)).where(RiskHistory.user_id.in_(patient_ids))
-    )
-    avg_risk = round(avg_result.scalar() or 0, 1)
+    # Crisis events and average risk from the daily rollup, independent of raw history size
+    totals = (await db.execute(
+        select(func.sum(RiskDailyRollup.crisis_count), func.sum(RiskDailyRollup.score_sum),
+               func.sum(RiskDailyRollup.count))
+        .where(auth.patient_filter(RiskDailyRollup.user_id))
+    )).one()
+    crisis_count = int(totals[0] or 0)
+    avg_risk = round(totals[1] / totals[2], 1) if totals[2] else 0
 
     # Intervention outcomes
     int_result = await db.execute(
-        select(Intervention).where(Intervention.user_id.in_(patient_ids))
+        select(Intervention.type, func.count(Intervention.id))
+        .where(auth.patient_filter(Intervention.user_id))
+        .group_by(Intervention.type)
     )
-    interventions = int_result.scalars().all()
-    outcomes = {}
-    for i in interventions:
-        outcomes[i.type] = outcomes.get(i.type, 0) + 1
-
-    # Risk over time (last 14 days aggregated)
-    rh_result = await db.execute(
-        select(RiskHistory).where(RiskHistory.user_id.in_(patient_ids))
-        .order_by(RiskHistory.date).limit(100)
+    outcomes = {itype: count for itype, count in int_result.all()}
+
+    # Risk over time: last 30 days, aggregated across patients
+    day_avg = (func.sum(RiskDailyRollup.score_sum) / func.sum(RiskDailyRollup.count)).label("avg_score")
+    timeline_result = await db.execute(
+        select(RiskDailyRollup.day, day_avg, func.max(RiskDailyRollup.max_score),
+               func.sum(RiskDailyRollup.crisis_count))
+        .where(auth.patient_filter(RiskDailyRollup.user_id))
+        .group_by(RiskDailyRollup.day)
+        .order_by(desc(RiskDailyRollup.day)).limit(30)
     )
-    all_history = rh_result.scalars().all()
+    timeline = list(reversed(timeline_result.all()))
 
     return {
         "crisis_events": crisis_count,
         "avg_risk": avg_risk,
-        "total_patients": len(patient_ids),
+        "total_patients": total_patients,
         "intervention_outcomes": outcomes,
         "risk_timeline": [
-            {"date": h.date.isoformat(), "score": h.score, "level": h.risk_level}
-            for h in all_history[-30:]
+            {"date": day.isoformat(), "score": round(avg, 1), "level": risk_level_for(avg),
+             "max_score": max_score, "crisis_events": int(crises or 0)}
+            for day, avg, max_score, crises in timeline
         ]
     }
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select
+from typing import Optional
 from database import get_db
 from models import Intervention, User, Clinician, InterventionRequest
 from agents.intervention import send_clinician_sms, book_therapy_appointment, get_crisis_resources
 from auth import get_current_clinician
+from pagination import fetch_page, DEFAULT_PAGE_SIZE
+from serialization import json_response, rows_as_dicts
 from datetime import datetime
 import uuid
 
@@ -86,16 +89,17 @@ async def escalate_emergency(
 @router.get("/{user_id}")
 async def get_intervention_history(
     user_id: str,
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
     db: AsyncSession = Depends(get_db),
     clinician_id: str = Depends(get_current_clinician)
 ):
-    result = await db.execute(
-        select(Intervention).where(Intervention.user_id == user_id)
-        .order_by(desc(Intervention.timestamp))
+    interventions = await fetch_page(
+        db, select(Intervention.id, Intervention.type, Intervention.triggered_by,
+                   Intervention.outcome, Intervention.timestamp)
+        .where(Intervention.user_id == user_id),
+        Intervention.timestamp, Intervention.id, response, before=before, after=after, limit=limit,
     )
-    interventions = result.scalars().all()
-    return [
-        {"id": i.id, "type": i.type, "triggered_by": i.triggered_by,
-         "outcome": i.outcome, "timestamp": i.timestamp.isoformat() if i.timestamp else None}
-        for i in interventions
-    ]
+    return json_response(rows_as_dicts(interventions), response)
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from database import get_db
+from sqlalchemy import select, func
+from typing import Optional
+from database import get_db, get_read_db
 from models import User, RiskHistory, Session as DBSession, PatientCreate
-from auth import get_current_clinician
-from datetime import datetime
+from auth import get_current_clinician, AuthContext, get_auth_context, invalidate_patient_scope
+from pagination import fetch_page, DEFAULT_PAGE_SIZE
+from serialization import json_response, rows_as_dicts
+from datetime import datetime, timedelta
 import uuid
 
 router = APIRouter()
@@ -12,88 +15,78 @@ router = APIRouter()
 
 @router.get("/")
 async def get_all_patients(
-    db: AsyncSession = Depends(get_db),
-    clinician_id: str = Depends(get_current_clinician)
+    db: AsyncSession = Depends(get_read_db),
+    auth: AuthContext = Depends(get_auth_context)
 ):
-    from models import Clinician
-    clin_result = await db.execute(select(Clinician).where(Clinician.id == clinician_id))
-    clinician = clin_result.scalars().first()
-    if clinician and clinician.role == "admin":
-        result = await db.execute(select(User))
-    else:
-        result = await db.execute(select(User).where(User.clinician_id == clinician_id))
-    patients = result.scalars().all()
-    out = []
-    for p in patients:
-        rh = await db.execute(
-            select(RiskHistory).where(RiskHistory.user_id == p.id)
-            .order_by(desc(RiskHistory.date)).limit(1)
-        )
-        latest = rh.scalars().first()
-        out.append({
-            "id": p.id, "name": p.name, "age": p.age,
-            "risk_score": latest.score if latest else 0,
-            "risk_level": latest.risk_level if latest else "LOW",
-            "last_active": latest.date.isoformat() if latest else None,
-            "emergency_contact": p.emergency_contact,
-        })
-    return out
+    result = await db.execute(
+        select(
+            User.id, User.name, User.age,
+            func.coalesce(User.latest_risk_score, 0).label("risk_score"),
+            func.coalesce(User.latest_risk_level, "LOW").label("risk_level"),
+            User.last_active_at.label("last_active"),
+            User.emergency_contact,
+        ).where(auth.patient_filter(User.id))
+    )
+    return json_response(rows_as_dicts(result))
 
 
 @router.get("/{patient_id}")
 async def get_patient(
     patient_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     clinician_id: str = Depends(get_current_clinician)
 ):
-    result = await db.execute(select(User).where(User.id == patient_id))
-    patient = result.scalars().first()
+    result = await db.execute(
+        select(User.id, User.name, User.age, User.clinician_id, User.emergency_contact, User.created_at)
+        .where(User.id == patient_id)
+    )
+    patient = result.first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
-    return {
-        "id": patient.id, "name": patient.name, "age": patient.age,
-        "clinician_id": patient.clinician_id,
-        "emergency_contact": patient.emergency_contact,
-        "created_at": patient.created_at.isoformat() if patient.created_at else None
-    }
+    return json_response(patient._asdict())
 
 
 @router.get("/{patient_id}/sessions")
 async def get_patient_sessions(
     patient_id: str,
-    db: AsyncSession = Depends(get_db),
+    response: Response,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
     clinician_id: str = Depends(get_current_clinician)
 ):
-    result = await db.execute(
-        select(DBSession).where(DBSession.user_id == patient_id)
-        .order_by(desc(DBSession.start_time))
+    sessions = await fetch_page(
+        db, select(DBSession.id, DBSession.start_time, DBSession.end_time,
+                   DBSession.overall_risk_score, DBSession.status)
+        .where(DBSession.user_id == patient_id),
+        DBSession.start_time, DBSession.id, response, before=before, after=after, limit=limit,
     )
-    sessions = result.scalars().all()
-    return [
-        {"id": s.id, "start_time": s.start_time.isoformat() if s.start_time else None,
-         "end_time": s.end_time.isoformat() if s.end_time else None,
-         "overall_risk_score": s.overall_risk_score, "status": s.status}
-        for s in sessions
-    ]
+    return json_response(rows_as_dicts(sessions), response)
 
 
 @router.get("/{patient_id}/risk-history")
 async def get_risk_history(
     patient_id: str,
+    response: Response,
     days: int = 14,
-    db: AsyncSession = Depends(get_db),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
     clinician_id: str = Depends(get_current_clinician)
 ):
-    result = await db.execute(
-        select(RiskHistory).where(RiskHistory.user_id == patient_id)
-        .order_by(RiskHistory.date).limit(days)
+    # The last `days` days, oldest first; page back with `before`
+    history = await fetch_page(
+        db, select(RiskHistory.id, RiskHistory.date, RiskHistory.score, RiskHistory.risk_level,
+                   RiskHistory.predicted_score, RiskHistory.factors).where(
+            RiskHistory.user_id == patient_id,
+            RiskHistory.date >= datetime.utcnow() - timedelta(days=days),
+        ),
+        RiskHistory.date, RiskHistory.id, response, before=before, after=after, limit=limit,
+        newest_first=False,
     )
-    history = result.scalars().all()
-    return [
-        {"date": h.date.isoformat(), "score": h.score, "risk_level": h.risk_level,
-         "predicted_score": h.predicted_score, "factors": h.factors}
-        for h in history
-    ]
+    return json_response(rows_as_dicts(history), response)
 
 
 @router.patch("/{patient_id}/emergency-contact")
@@ -128,4 +121,5 @@ async def create_patient(
     )
     db.add(new_patient)
     await db.commit()
+    invalidate_patient_scope(clinician_id)
     return {"id": new_patient.id, "name": new_patient.name, "message": "Patient created"}
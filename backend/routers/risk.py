@@ -1,66 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
-from database import get_db
-from models import RiskHistory, RiskAnalyzeRequest
-from agents.detection import detect_risk
-from agents.memory import predict_crisis
+from typing import Optional
+from datetime import datetime, timedelta
+from database import get_read_db
+from models import RiskHistory, RiskPrediction, RiskAnalyzeRequest, RiskAnalyzeBatchRequest
+from agents.detection import detect_risk, detect_risk_many, BATCH_LLM_CONCURRENCY
+from agents.memory import predict_crisis, TREND_WINDOW
+from jobs.predictions import prediction_as_dict
 from auth import get_current_clinician
+from pagination import fetch_page, DEFAULT_PAGE_SIZE
+from serialization import json_response, rows_as_dicts
 
 router = APIRouter()
 
+MAX_BATCH_MESSAGES = 10000
+
 
 @router.get("/{user_id}/current")
 async def get_current_risk(
     user_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     clinician_id: str = Depends(get_current_clinician)
 ):
     result = await db.execute(
-        select(RiskHistory).where(RiskHistory.user_id == user_id)
+        select(RiskHistory.score, RiskHistory.risk_level, RiskHistory.factors,
+               RiskHistory.predicted_score, RiskHistory.date)
+        .where(RiskHistory.user_id == user_id)
         .order_by(desc(RiskHistory.date)).limit(1)
     )
-    latest = result.scalars().first()
+    latest = result.first()
     if not latest:
         raise HTTPException(status_code=404, detail="No risk data found")
-    return {
-        "score": latest.score, "risk_level": latest.risk_level,
-        "factors": latest.factors, "predicted_score": latest.predicted_score,
-        "date": latest.date.isoformat()
-    }
+    return json_response(latest._asdict())
 
 
 @router.get("/{user_id}/trend")
 async def get_risk_trend(
     user_id: str,
+    response: Response,
     days: int = 14,
-    db: AsyncSession = Depends(get_db),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
     clinician_id: str = Depends(get_current_clinician)
 ):
-    result = await db.execute(
-        select(RiskHistory).where(RiskHistory.user_id == user_id)
-        .order_by(RiskHistory.date).limit(days)
+    history = await fetch_page(
+        db, select(RiskHistory.id, RiskHistory.date, RiskHistory.score,
+                   RiskHistory.risk_level, RiskHistory.predicted_score).where(
+            RiskHistory.user_id == user_id,
+            RiskHistory.date >= datetime.utcnow() - timedelta(days=days),
+        ),
+        RiskHistory.date, RiskHistory.id, response, before=before, after=after, limit=limit,
+        newest_first=False,
     )
-    history = result.scalars().all()
-    return [
-        {"date": h.date.isoformat(), "score": h.score,
-         "risk_level": h.risk_level, "predicted_score": h.predicted_score}
-        for h in history
-    ]
+    return json_response(rows_as_dicts(history), response)
 
 
 @router.get("/{user_id}/predict")
 async def predict_crisis_endpoint(
     user_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     clinician_id: str = Depends(get_current_clinician)
 ):
+    stored = await db.get(RiskPrediction, user_id)
+    if stored:
+        return prediction_as_dict(stored)
+
+    # Not scored by the prediction job yet (e.g. a brand-new patient); compute on demand
     result = await db.execute(
-        select(RiskHistory).where(RiskHistory.user_id == user_id)
-        .order_by(RiskHistory.date).limit(14)
+        select(RiskHistory.score).where(RiskHistory.user_id == user_id)
+        .order_by(desc(RiskHistory.date)).limit(TREND_WINDOW + 1)
     )
-    history = result.scalars().all()
-    scores = [h.score for h in history]
+    scores = list(reversed(result.scalars().all()))
     return await predict_crisis(user_id, scores)
 
 
@@ -70,3 +83,14 @@ async def analyze_message(
     clinician_id: str = Depends(get_current_clinician)
 ):
     return await detect_risk(request.message)
+
+
+@router.post("/analyze-batch")
+async def analyze_batch(
+    request: RiskAnalyzeBatchRequest,
+    clinician_id: str = Depends(get_current_clinician)
+):
+    if len(request.messages) > MAX_BATCH_MESSAGES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_MESSAGES} messages per batch")
+    concurrency = min(request.concurrency or BATCH_LLM_CONCURRENCY, BATCH_LLM_CONCURRENCY)
+    return await detect_risk_many(request.messages, use_llm=request.use_llm, concurrency=concurrency)
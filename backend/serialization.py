@@ -0,0 +1,19 @@
+"""
+Response helpers for the read endpoints.
+
+Rows from column-projected selects become plain dicts (labels match the API
+field names) and are rendered straight to bytes with orjson, skipping FastAPI's
+jsonable_encoder pass. orjson writes naive datetimes in isoformat, so the
+payloads are unchanged.
+"""
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+
+def rows_as_dicts(rows) -> list:
+    return [row._asdict() for row in rows]
+
+
+def json_response(content, response: Response = None) -> ORJSONResponse:
+    """Render `content` with orjson, carrying over headers already set on the injected `response`."""
+    return ORJSONResponse(content, headers=dict(response.headers) if response is not None else None)
@@ -0,0 +1,204 @@
+"""
+Object storage for voice audio.
+
+ObjectStorage streams async chunk iterators into a backend without buffering
+whole files: S3Storage turns them into a multipart upload (parts sent on a
+dedicated thread pool with one shared, pooled boto3 client), LocalStorage
+writes them to disk under LOCAL_STORAGE_DIR. STORAGE_BACKEND picks one.
+"""
+import asyncio, os, uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import UploadFile
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "s3")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "storage")
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# S3 parts must be at least 5 MiB except the last
+S3_PART_SIZE = max(5, int(os.getenv("S3_PART_SIZE_MB", "8"))) * 1024 * 1024
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+S3_MAX_WORKERS = int(os.getenv("S3_MAX_WORKERS", "16"))
+
+
+class StoredObject:
+    __slots__ = ("key", "url", "size")
+
+    def __init__(self, key: str, url: str, size: int):
+        self.key = key
+        self.url = url
+        self.size = size
+
+
+class SharedUpload:
+    """Independent chunk iterators over one UploadFile, so several consumers can read it concurrently.
+
+    Each iterator tracks its own offset; a lock keeps another reader's seek
+    from landing between this reader's seek and read.
+    """
+
+    def __init__(self, upload: UploadFile):
+        self.upload = upload
+        self._lock = asyncio.Lock()
+
+    async def chunks(self, chunk_size: int = UPLOAD_CHUNK_SIZE):
+        offset = 0
+        while True:
+            async with self._lock:
+                await self.upload.seek(offset)
+                chunk = await self.upload.read(chunk_size)
+            if not chunk:
+                return
+            offset += len(chunk)
+            yield chunk
+
+
+async def _single(data: bytes):
+    yield data
+
+
+class ObjectStorage(ABC):
+    @abstractmethod
+    async def upload_stream(self, key: str, chunks, content_type: str = "application/octet-stream") -> StoredObject:
+        """Store the async iterator `chunks` under `key` without buffering the whole object."""
+
+    async def upload_bytes(self, data: bytes, key: str, content_type: str = "application/octet-stream") -> StoredObject:
+        return await self.upload_stream(key, _single(data), content_type)
+
+    def shutdown(self):
+        pass
+
+
+class S3Storage(ObjectStorage):
+    def __init__(self, bucket: str = None, region: str = None, part_size: int = S3_PART_SIZE,
+                 concurrency: int = S3_UPLOAD_CONCURRENCY, max_workers: int = S3_MAX_WORKERS):
+        from botocore.config import Config
+        from aws_config import _aws_session, S3_BUCKET, AWS_REGION
+        self.bucket = bucket or S3_BUCKET
+        self.region = region or AWS_REGION
+        self.part_size = part_size
+        self.concurrency = max(1, concurrency)
+        # boto3 clients are thread-safe; one client shares its connection pool across all workers
+        self._client = _aws_session.client("s3", config=Config(max_pool_connections=max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3")
+
+    def url(self, key: str) -> str:
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    async def _call(self, fn, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, lambda: fn(**kwargs))
+
+    async def _upload_part(self, key: str, upload_id: str, number: int, body: bytes) -> dict:
+        resp = await self._call(self._client.upload_part, Bucket=self.bucket, Key=key,
+                                UploadId=upload_id, PartNumber=number, Body=body)
+        return {"PartNumber": number, "ETag": resp["ETag"]}
+
+    async def upload_stream(self, key, chunks, content_type="application/octet-stream"):
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        in_flight = set()
+        parts = []
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                while len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        resp = await self._call(self._client.create_multipart_upload, Bucket=self.bucket,
+                                                Key=key, ContentType=content_type)
+                        upload_id = resp["UploadId"]
+                    # Bound memory: at most `concurrency` parts in flight plus the one being filled
+                    if len(in_flight) >= self.concurrency:
+                        done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                        parts.extend(t.result() for t in done)
+                    body = bytes(buffer[:self.part_size])
+                    del buffer[:self.part_size]
+                    number = len(parts) + len(in_flight) + 1
+                    in_flight.add(asyncio.ensure_future(self._upload_part(key, upload_id, number, body)))
+
+            if upload_id is None:
+                await self._call(self._client.put_object, Bucket=self.bucket, Key=key,
+                                 Body=bytes(buffer), ContentType=content_type)
+                return StoredObject(key, self.url(key), size)
+
+            if buffer:
+                in_flight.add(asyncio.ensure_future(
+                    self._upload_part(key, upload_id, len(parts) + len(in_flight) + 1, bytes(buffer))))
+            parts.extend(await asyncio.gather(*in_flight))
+            in_flight = set()
+            await self._call(self._client.complete_multipart_upload, Bucket=self.bucket, Key=key,
+                             UploadId=upload_id,
+                             MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])})
+            return StoredObject(key, self.url(key), size)
+        except BaseException:
+            for task in in_flight:
+                task.cancel()
+            if upload_id is not None:
+                try:
+                    await self._call(self._client.abort_multipart_upload, Bucket=self.bucket,
+                                     Key=key, UploadId=upload_id)
+                except Exception as e:
+                    print(f"[Storage] abort of multipart upload {key} failed: {e}")
+            raise
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class LocalStorage(ObjectStorage):
+    def __init__(self, root: str = LOCAL_STORAGE_DIR):
+        self.root = os.path.abspath(root)
+
+    def path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Key escapes storage root: {key}")
+        return path
+
+    def url(self, key: str) -> str:
+        return f"file://{self.path(key)}"
+
+    async def upload_stream(self, key, chunks, content_type="application/octet-stream"):
+        path = self.path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+        fh = await asyncio.to_thread(open, tmp_path, "wb")
+        size = 0
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(fh.write, chunk)
+                size += len(chunk)
+        except BaseException:
+            await asyncio.to_thread(fh.close)
+            await asyncio.to_thread(os.remove, tmp_path)
+            raise
+        await asyncio.to_thread(fh.close)
+        await asyncio.to_thread(os.replace, tmp_path, path)
+        return StoredObject(key, self.url(key), size)
+
+
+_backends = {}
+
+
+def get_storage() -> ObjectStorage:
+    """The configured backend (STORAGE_BACKEND=s3|local)."""
+    return local_storage() if STORAGE_BACKEND == "local" else s3_storage()
+
+
+def s3_storage() -> S3Storage:
+    """The S3 backend regardless of STORAGE_BACKEND, for AWS services that read from S3."""
+    if "s3" not in _backends:
+        _backends["s3"] = S3Storage()
+    return _backends["s3"]
+
+
+def local_storage() -> LocalStorage:
+    if "local" not in _backends:
+        _backends["local"] = LocalStorage()
+    return _backends["local"]
+
+
+def shutdown_storage():
+    for backend in _backends.values():
+        backend.shutdown()
+    _backends.clear()
@@ -0,0 +1,281 @@
+"""
+Speech-to-text for voice messages.
+
+Transcriber turns an async iterator of audio chunks into text. TRANSCRIBE_BACKEND
+picks the engine:
+
+- batch:     Amazon Transcribe jobs on audio in S3. One shared client, calls
+             off the event loop, polling that starts near the expected job
+             time and backs off exponentially.
+- streaming: Amazon Transcribe streaming (pip install amazon-transcribe). Audio
+             is transcoded to 16 kHz mono PCM by ffmpeg and sent while it is
+             still being read.
+- local:     faster-whisper on CPU (pip install faster-whisper), fully offline.
+"""
+import asyncio, io, os, time, uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "batch")
+TRANSCRIBE_LANGUAGE = os.getenv("TRANSCRIBE_LANGUAGE", "en-US")
+TRANSCRIBE_TIMEOUT = float(os.getenv("TRANSCRIBE_TIMEOUT_SECONDS", "30"))
+TRANSCRIBE_POLL_MIN = float(os.getenv("TRANSCRIBE_POLL_MIN_MS", "250")) / 1000
+TRANSCRIBE_POLL_MAX = float(os.getenv("TRANSCRIBE_POLL_MAX_MS", "1000")) / 1000
+STREAMING_SAMPLE_RATE = 16000
+STREAMING_CHUNK_SIZE = 8 * 1024
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base.en")
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+LOCAL_TRANSCRIBE_WORKERS = int(os.getenv("LOCAL_TRANSCRIBE_WORKERS", "1"))
+LOCAL_TRANSCRIBE_THREADS = int(os.getenv("LOCAL_TRANSCRIBE_THREADS", "0"))
+
+
+class Transcriber(ABC):
+    name = "base"
+    # True when the engine reads the audio from S3 rather than from the chunks
+    reads_from_s3 = False
+
+    def __init__(self):
+        self._calls = 0
+        self._failures = 0
+        self._total_seconds = 0.0
+        self._last_seconds = 0.0
+
+    async def transcribe(self, chunks, media_format: str = "webm", s3_url: str = None) -> str:
+        """Text of the audio in `chunks`. Backends reading from S3 use `s3_url` when given."""
+        start = time.perf_counter()
+        self._calls += 1
+        try:
+            return await self._transcribe(chunks, media_format, s3_url)
+        except BaseException:
+            self._failures += 1
+            raise
+        finally:
+            self._last_seconds = time.perf_counter() - start
+            self._total_seconds += self._last_seconds
+
+    @abstractmethod
+    async def _transcribe(self, chunks, media_format: str, s3_url: str) -> str:
+        """Backend-specific transcription; `transcribe` wraps it with the call counters."""
+
+    async def warmup(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "calls": self._calls,
+            "failures": self._failures,
+            "avg_ms": round(self._total_seconds / self._calls * 1000, 1) if self._calls else 0.0,
+            "last_ms": round(self._last_seconds * 1000, 1),
+        }
+
+
+class BatchTranscriber(Transcriber):
+    """Amazon Transcribe batch jobs with adaptive polling."""
+    name = "batch"
+    reads_from_s3 = True
+
+    def __init__(self, timeout: float = TRANSCRIBE_TIMEOUT, poll_min: float = TRANSCRIBE_POLL_MIN,
+                 poll_max: float = TRANSCRIBE_POLL_MAX):
+        super().__init__()
+        import httpx
+        from aws_config import _aws_session, AWS_REGION
+        self.timeout = timeout
+        self.poll_min = poll_min
+        self.poll_max = max(poll_min, poll_max)
+        self._client = _aws_session.client("transcribe", region_name=AWS_REGION)
+        self._http = httpx.AsyncClient(timeout=10)
+        # Moving average of job completion time; the first poll waits for most of it
+        self._expected = None
+        self._polls = 0
+
+    async def _call(self, fn, **kwargs):
+        return await asyncio.to_thread(lambda: fn(**kwargs))
+
+    async def _transcribe(self, chunks, media_format, s3_url):
+        job_name = f"mg-{uuid.uuid4().hex[:16]}"
+        if not s3_url:
+            from storage import s3_storage
+            stored = await s3_storage().upload_stream(f"voice/tmp/{job_name}.{media_format}", chunks,
+                                                      f"audio/{media_format}")
+            s3_url = stored.url
+
+        await self._call(self._client.start_transcription_job, TranscriptionJobName=job_name,
+                         Media={"MediaFileUri": s3_url}, MediaFormat=media_format,
+                         LanguageCode=TRANSCRIBE_LANGUAGE)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.timeout
+        delay = max(self.poll_min, 0.8 * self._expected) if self._expected else self.poll_min
+        while True:
+            await asyncio.sleep(min(delay, max(0.0, deadline - loop.time())))
+            self._polls += 1
+            job = (await self._call(self._client.get_transcription_job,
+                                    TranscriptionJobName=job_name))["TranscriptionJob"]
+            status = job["TranscriptionJobStatus"]
+            if status == "COMPLETED":
+                # The job finished somewhere within the last sleep; take the midpoint
+                elapsed = loop.time() - started - delay / 2
+                self._expected = elapsed if self._expected is None else 0.8 * self._expected + 0.2 * elapsed
+                resp = await self._http.get(job["Transcript"]["TranscriptFileUri"])
+                resp.raise_for_status()
+                return resp.json()["results"]["transcripts"][0]["transcript"]
+            if status == "FAILED":
+                raise RuntimeError(f"Transcription job {job_name} failed: {job.get('FailureReason')}")
+            if loop.time() >= deadline:
+                raise TimeoutError(f"Transcription job {job_name} still {status} after {self.timeout:.0f}s")
+            # After a long first wait, fall back to tight polling and back off again
+            delay = self.poll_min if delay > self.poll_max else min(self.poll_max, delay * 1.5)
+
+    async def close(self):
+        await self._http.aclose()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "polls": self._polls,
+                "expected_job_ms": round(self._expected * 1000, 1) if self._expected else None}
+
+
+def _session_credential_resolver(session):
+    """Resolver that asks the boto3 session on every stream, so expiring role credentials get refreshed."""
+    from amazon_transcribe.auth import CredentialResolver, Credentials
+
+    class SessionCredentialResolver(CredentialResolver):
+        async def get_credentials(self):
+            credentials = await asyncio.to_thread(session.get_credentials)
+            if credentials is None:
+                return None
+            frozen = await asyncio.to_thread(credentials.get_frozen_credentials)
+            return Credentials(frozen.access_key, frozen.secret_key, frozen.token)
+
+    return SessionCredentialResolver()
+
+
+class StreamingTranscriber(Transcriber):
+    """Amazon Transcribe streaming; transcription runs while audio is still arriving."""
+    name = "streaming"
+
+    def __init__(self):
+        super().__init__()
+        from amazon_transcribe.client import TranscribeStreamingClient
+        from aws_config import _aws_session, AWS_REGION
+        self._client = TranscribeStreamingClient(region=AWS_REGION,
+                                                 credential_resolver=_session_credential_resolver(_aws_session))
+
+    async def _transcribe(self, chunks, media_format, s3_url):
+        from amazon_transcribe.handlers import TranscriptResultStreamHandler
+
+        class Collector(TranscriptResultStreamHandler):
+            def __init__(self, output_stream):
+                super().__init__(output_stream)
+                self.parts = []
+
+            async def handle_transcript_event(self, transcript_event):
+                for result in transcript_event.transcript.results:
+                    if not result.is_partial and result.alternatives:
+                        self.parts.append(result.alternatives[0].transcript)
+
+        # Everything goes through ffmpeg so the stream's declared sample rate is always the real one
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1",
+            "-ar", str(STREAMING_SAMPLE_RATE), "pipe:1",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+        try:
+            stream = await self._client.start_stream_transcription(
+                language_code=TRANSCRIBE_LANGUAGE, media_sample_rate_hz=STREAMING_SAMPLE_RATE,
+                media_encoding="pcm")
+            collector = Collector(stream.output_stream)
+
+            async def feed_ffmpeg():
+                try:
+                    async for chunk in chunks:
+                        process.stdin.write(chunk)
+                        await process.stdin.drain()
+                finally:
+                    process.stdin.close()
+
+            async def send_audio():
+                while pcm := await process.stdout.read(STREAMING_CHUNK_SIZE):
+                    await stream.input_stream.send_audio_event(audio_chunk=pcm)
+                await stream.input_stream.end_stream()
+
+            await asyncio.wait_for(asyncio.gather(feed_ffmpeg(), send_audio(), collector.handle_events()),
+                                   TRANSCRIBE_TIMEOUT)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        return " ".join(collector.parts)
+
+
+class LocalTranscriber(Transcriber):
+    """faster-whisper on CPU. The model loads once and runs on a dedicated executor."""
+    name = "local"
+
+    def __init__(self, model_name: str = LOCAL_WHISPER_MODEL, compute_type: str = LOCAL_WHISPER_COMPUTE_TYPE,
+                 workers: int = LOCAL_TRANSCRIBE_WORKERS, cpu_threads: int = LOCAL_TRANSCRIBE_THREADS):
+        super().__init__()
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.workers = max(1, workers)
+        self.cpu_threads = cpu_threads
+        self._model = None
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="whisper")
+
+    def _load(self):
+        if self._model is None:
+            from faster_whisper import WhisperModel
+            self._model = WhisperModel(self.model_name, device="cpu", compute_type=self.compute_type,
+                                       cpu_threads=self.cpu_threads, num_workers=self.workers)
+        return self._model
+
+    def _run(self, audio: io.BytesIO) -> str:
+        segments, _ = self._load().transcribe(audio, language=TRANSCRIBE_LANGUAGE.split("-")[0],
+                                              beam_size=1, vad_filter=True)
+        return " ".join(segment.text.strip() for segment in segments)
+
+    async def _transcribe(self, chunks, media_format, s3_url):
+        audio = io.BytesIO()
+        async for chunk in chunks:
+            audio.write(chunk)
+        audio.seek(0)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._run, audio)
+
+    async def warmup(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._load)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+_BACKENDS = {"batch": BatchTranscriber, "streaming": StreamingTranscriber, "local": LocalTranscriber}
+_transcriber = None
+
+
+def get_transcriber() -> Transcriber:
+    global _transcriber
+    if _transcriber is None:
+        if TRANSCRIBE_BACKEND not in _BACKENDS:
+            raise ValueError(f"Unknown TRANSCRIBE_BACKEND {TRANSCRIBE_BACKEND!r}; expected one of {sorted(_BACKENDS)}")
+        _transcriber = _BACKENDS[TRANSCRIBE_BACKEND]()
+    return _transcriber
+
+
+async def warmup_transcriber():
+    try:
+        await get_transcriber().warmup()
+    except Exception as e:
+        print(f"[Transcribe] {TRANSCRIBE_BACKEND} backend unavailable: {e}")
+
+
+async def close_transcriber():
+    global _transcriber
+    if _transcriber is not None:
+        await _transcriber.close()
+        _transcriber = None
+
+
+def transcriber_stats() -> dict:
+    return _transcriber.stats() if _transcriber else {"backend": TRANSCRIBE_BACKEND, "calls": 0}
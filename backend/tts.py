@@ -0,0 +1,199 @@
+"""
+Text-to-speech for agent replies, with a content-addressed disk cache.
+
+Audio is keyed on sha256(engine, voice, text) and stored as <key>.mp3 under
+TTS_CACHE_DIR. The cache is bounded by TTS_CACHE_MAX_MB and evicts the least
+recently used files; the canned fallback replies are synthesized at startup
+and pinned so they are never evicted. Concurrent requests for the same text
+share one Polly call.
+"""
+import asyncio, hashlib, os, re, time, uuid
+from collections import OrderedDict
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "256")) * 1024 * 1024)
+TTS_VOICE = os.getenv("TTS_VOICE", "Joanna")
+TTS_ENGINE = os.getenv("TTS_ENGINE", "neural")
+TTS_MAX_CHARS = 3000
+
+AUDIO_KEY_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def audio_key(text: str, voice: str = TTS_VOICE, engine: str = TTS_ENGINE) -> str:
+    return hashlib.sha256(f"{engine}\0{voice}\0{text}".encode()).hexdigest()
+
+
+class AudioCache:
+    """Size-bounded LRU of MP3 files on local disk."""
+
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._pinned = set()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        os.makedirs(self.directory, exist_ok=True)
+        # Rebuild the index from disk, oldest access first
+        found = []
+        for entry in os.scandir(self.directory):
+            key, ext = os.path.splitext(entry.name)
+            if ext == ".mp3" and AUDIO_KEY_RE.fullmatch(key):
+                stat = entry.stat()
+                found.append((stat.st_atime, key, stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def get(self, key: str):
+        """Path of the cached audio for `key`, or None."""
+        if key not in self._entries:
+            self._misses += 1
+            return None
+        if not os.path.exists(self.path(key)):
+            self._bytes -= self._entries.pop(key)
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return self.path(key)
+
+    def _write(self, key: str, data: bytes):
+        tmp_path = f"{self.path(key)}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, self.path(key))
+
+    async def put(self, key: str, data: bytes, pin: bool = False) -> str:
+        await asyncio.to_thread(self._write, key, data)
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)
+        self._entries[key] = len(data)
+        self._bytes += len(data)
+        if pin:
+            self._pinned.add(key)
+        await self._evict()
+        return self.path(key)
+
+    async def _evict(self):
+        victims = []
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if key in self._pinned:
+                continue
+            self._bytes -= self._entries.pop(key)
+            victims.append(self.path(key))
+        for path in victims:
+            try:
+                await asyncio.to_thread(os.remove, path)
+            except FileNotFoundError:
+                pass
+        self._evictions += len(victims)
+
+    def pin(self, key: str):
+        self._pinned.add(key)
+
+    def stats(self) -> dict:
+        total = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "pinned": len(self._pinned),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / total, 3) if total else 0.0,
+            "evictions": self._evictions,
+        }
+
+
+class SpeechSynthesizer:
+    """Polly synthesis through an AudioCache. One shared client, calls off the event loop."""
+
+    def __init__(self, cache: AudioCache = None, voice: str = TTS_VOICE, engine: str = TTS_ENGINE):
+        from aws_config import _aws_session, AWS_REGION
+        self.cache = cache or AudioCache()
+        self.voice = voice
+        self.engine = engine
+        self._polly = _aws_session.client("polly", region_name=AWS_REGION)
+        self._in_flight = {}
+        self._synth_calls = 0
+        self._synth_seconds = 0.0
+
+    def _render(self, text: str) -> bytes:
+        resp = self._polly.synthesize_speech(Text=text, OutputFormat="mp3", VoiceId=self.voice, Engine=self.engine)
+        with resp["AudioStream"] as stream:
+            return stream.read()
+
+    async def synthesize(self, text: str, pin: bool = False) -> str:
+        """Cache key of the MP3 for `text`, synthesizing it on a miss."""
+        text = text[:TTS_MAX_CHARS]
+        key = audio_key(text, self.voice, self.engine)
+        if self.cache.get(key):
+            if pin:
+                self.cache.pin(key)
+            return key
+        pending = self._in_flight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._synthesize_miss(key, text, pin))
+            self._in_flight[key] = pending
+            pending.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        await asyncio.shield(pending)
+        return key
+
+    async def _synthesize_miss(self, key: str, text: str, pin: bool):
+        start = time.perf_counter()
+        data = await asyncio.to_thread(self._render, text)
+        self._synth_calls += 1
+        self._synth_seconds += time.perf_counter() - start
+        await self.cache.put(key, data, pin=pin)
+
+    async def presynthesize(self, texts) -> int:
+        """Synthesize and pin `texts`; returns how many are available."""
+        ready = 0
+        for text in texts:
+            try:
+                await self.synthesize(text, pin=True)
+                ready += 1
+            except Exception as e:
+                print(f"[TTS] presynthesis failed: {e}")
+                break
+        return ready
+
+    def stats(self) -> dict:
+        return {
+            "voice": self.voice,
+            "engine": self.engine,
+            "polly_calls": self._synth_calls,
+            "avg_polly_ms": round(self._synth_seconds / self._synth_calls * 1000, 1) if self._synth_calls else 0.0,
+            "cache": self.cache.stats(),
+        }
+
+
+_synthesizer = None
+
+
+def get_synthesizer() -> SpeechSynthesizer:
+    global _synthesizer
+    if _synthesizer is None:
+        _synthesizer = SpeechSynthesizer()
+    return _synthesizer
+
+
+async def presynthesize_fallbacks():
+    from agents.conversational import FALLBACK_RESPONSES
+    try:
+        ready = await get_synthesizer().presynthesize(FALLBACK_RESPONSES.values())
+        print(f"[TTS] {ready}/{len(FALLBACK_RESPONSES)} fallback replies cached")
+    except Exception as e:
+        print(f"[TTS] presynthesis unavailable: {e}")
+
+
+def tts_stats() -> dict:
+    return _synthesizer.stats() if _synthesizer else {"voice": TTS_VOICE, "engine": TTS_ENGINE, "polly_calls": 0}
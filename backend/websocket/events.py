@@ -1,8 +1,21 @@
 import socketio
+from pydantic import ValidationError
+from database import AsyncSessionLocal
+from models import ChatRequest
+from websocket.ingress import ChatIngress
 
 sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
 
 
+async def _run_chat_turn(request: ChatRequest) -> dict:
+    from routers.chat import run_chat_turn
+    async with AsyncSessionLocal() as db:
+        return await run_chat_turn(request, db)
+
+
+chat_ingress = ChatIngress(sio, _run_chat_turn)
+
+
 @sio.event
 async def connect(sid, environ):
     print(f"[WS] Client connected: {sid}")
@@ -22,6 +35,23 @@ async def join_dashboard(sid, data):
     print(f"[WS] {sid} joined dashboard")
 
 
+@sio.event
+async def send_message(sid, data):
+    """Same pipeline as POST /api/chat/message; the ack reports whether the message was queued."""
+    if not isinstance(data, dict):
+        return {"status": "invalid", "client_msg_id": None}
+    client_msg_id = data.get("client_msg_id")
+    try:
+        request = ChatRequest(user_id=data.get("user_id"), session_id=data.get("session_id"),
+                              message=data.get("message"))
+    except ValidationError:
+        return {"status": "invalid", "client_msg_id": client_msg_id}
+    # The sender receives its results through the session room
+    await sio.enter_room(sid, f"session_{request.session_id}")
+    return await chat_ingress.submit(sid, request, client_msg_id)
+
+
 @sio.event
 async def disconnect(sid):
+    chat_ingress.forget(sid)
     print(f"[WS] Client disconnected: {sid}")
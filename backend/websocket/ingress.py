@@ -0,0 +1,104 @@
+"""
+Chat ingress over Socket.IO.
+
+Messages for the same session are processed strictly in arrival order by one
+worker task per active session; different sessions run concurrently. Each
+client may have at most SOCKET_MAX_IN_FLIGHT messages queued or running.
+At the limit it receives a "backpressure" event with paused=True and further
+messages are refused. Once its backlog drains to half the limit it receives
+paused=False. Results go to the session_{id} room only.
+"""
+import asyncio, os
+from collections import deque
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+SOCKET_MAX_IN_FLIGHT = int(os.getenv("SOCKET_MAX_IN_FLIGHT", "8"))
+
+
+class ChatIngress:
+    def __init__(self, sio, handler, max_in_flight: int = SOCKET_MAX_IN_FLIGHT):
+        """`handler(request)` runs one chat turn and returns its result payload."""
+        self.sio = sio
+        self.handler = handler
+        self.max_in_flight = max(1, max_in_flight)
+        self._queues = {}    # session_id -> deque of (sid, request, client_msg_id)
+        self._workers = {}   # session_id -> worker task
+        self._in_flight = {}  # sid -> queued + running messages
+        self._paused = set()
+        self._accepted = 0
+        self._rejected = 0
+        self._failed = 0
+
+    async def submit(self, sid: str, request, client_msg_id=None) -> dict:
+        """Queue `request` for its session; returns the ack sent back to the client."""
+        count = self._in_flight.get(sid, 0)
+        if count >= self.max_in_flight:
+            self._rejected += 1
+            return {"status": "busy", "client_msg_id": client_msg_id,
+                    "in_flight": count, "limit": self.max_in_flight}
+
+        self._in_flight[sid] = count + 1
+        self._accepted += 1
+        if count + 1 >= self.max_in_flight and sid not in self._paused:
+            self._paused.add(sid)
+            await self._signal(sid, True)
+
+        queue = self._queues.setdefault(request.session_id, deque())
+        queue.append((sid, request, client_msg_id))
+        if request.session_id not in self._workers:
+            self._workers[request.session_id] = asyncio.create_task(self._drain(request.session_id))
+        return {"status": "queued", "client_msg_id": client_msg_id, "position": len(queue)}
+
+    async def _drain(self, session_id: str):
+        queue = self._queues[session_id]
+        room = f"session_{session_id}"
+        try:
+            while queue:
+                sid, request, client_msg_id = queue.popleft()
+                try:
+                    result = await self.handler(request)
+                    await self.sio.emit("message_result", jsonable_encoder(
+                        {"client_msg_id": client_msg_id, "session_id": session_id, **result}), room=room)
+                except Exception as e:
+                    self._failed += 1
+                    detail = e.detail if isinstance(e, HTTPException) else "Message could not be processed"
+                    if not isinstance(e, HTTPException):
+                        print(f"[WS] message for session {session_id} failed: {e}")
+                    await self.sio.emit("message_error", {"client_msg_id": client_msg_id,
+                                                          "session_id": session_id, "detail": detail}, to=sid)
+                finally:
+                    await self._release(sid)
+        finally:
+            self._queues.pop(session_id, None)
+            self._workers.pop(session_id, None)
+
+    async def _release(self, sid: str):
+        count = self._in_flight.get(sid, 1) - 1
+        if count <= 0:
+            self._in_flight.pop(sid, None)
+        else:
+            self._in_flight[sid] = count
+        if sid in self._paused and count <= self.max_in_flight // 2:
+            self._paused.discard(sid)
+            await self._signal(sid, False)
+
+    async def _signal(self, sid: str, paused: bool):
+        await self.sio.emit("backpressure", {"paused": paused, "in_flight": self._in_flight.get(sid, 0),
+                                             "limit": self.max_in_flight}, to=sid)
+
+    def forget(self, sid: str):
+        """Drop flow-control state for a disconnected client; its queued messages still run."""
+        self._paused.discard(sid)
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "active_sessions": len(self._workers),
+            "queued": sum(len(q) for q in self._queues.values()),
+            "clients_in_flight": len(self._in_flight),
+            "paused_clients": len(self._paused),
+            "accepted": self._accepted,
+            "rejected": self._rejected,
+            "failed": self._failed,
+        }